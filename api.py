@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config import Config
+from main import prepare_faces, build_polygons, render_part, part_records, write_beds
+from output import MemoryOutput
+from renderer import get_renderer
+
+
+class Part(object):
+    """A rendered part, lines are in the part's own coordinates before it is placed on a bed."""
+    def __init__(self, index, record, renderer):
+        self.index = index
+        # the part's edge indices and the parts its edges mate with
+        self.edges = record['edges']
+        self.mates = record['mates']
+        self.lines, self.colors = renderer.lines
+        self.box = renderer.box
+        self.area = renderer.area
+        self.renderer = renderer
+
+
+class Bed(object):
+    """A packed bed, data is the rendered file and preview the .png thumbnail if one was asked for."""
+    def __init__(self, name, extension, data, record, preview=None):
+        self.name = name
+        self.extension = extension
+        self.data = data
+        self.preview = preview
+        self.report = record['report']
+        # records of the parts on the bed with their rotation and packed bounding box
+        self.parts = record['parts']
+
+
+class Result(object):
+    def __init__(self, parts, beds, report):
+        self.parts = parts
+        self.beds = beds
+        self.report = report
+
+    @property
+    def unpacked(self):
+        # indices of parts too large to fit on a bed
+        return self.report['unpacked']
+
+    @property
+    def sharding(self):
+        # stats of the sharded packing, None unless there were enough parts to pack in shards
+        return self.report.get('sharding')
+
+
+def convert(vectors, normals, config=None, merge=True, render_panels=True, optimize_paths=True, preview=False,
+            renderer_name='dxf', workers=None, name='mesh'):
+    """
+    Convert a mesh into parts and packed beds without touching the disk.
+
+    vectors: (n, 3, 3) vertices of each triangle, like numpy-stl's Mesh.vectors
+    normals: (n, 3) normal of each triangle
+    config: a Config instance, defaults to Config()
+    name: prefix of the bed names
+    Parts too large for a bed and the sharding stats are returned in the Result rather than printed.
+    """
+    renderer = get_renderer(renderer_name)
+    if renderer.extension is None:
+        raise ValueError('Renderer {0} doesn\'t produce files.'.format(renderer_name))
+    vectors, normals = np.asarray(vectors), np.asarray(normals)
+    if vectors.ndim != 3 or vectors.shape[1:] != (3, 3) or normals.shape != (len(vectors), 3):
+        raise ValueError('Expected (n, 3, 3) vectors and (n, 3) normals, got {0} and {1}.'.format(
+            vectors.shape, normals.shape))
+
+    if config is None:
+        config = Config()
+    output = MemoryOutput()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        faces, face_normals = prepare_faces(vectors, normals, merge, config)
+        polys = build_polygons(faces, face_normals)
+        records = part_records(polys)
+        renderers = list(pool.map(lambda p: render_part(p, render_panels, config), polys))
+        report = write_beds(renderer, output, name, polys, renderers, records, render_panels=render_panels,
+                            optimize_paths=optimize_paths, preview=preview, pool_map=pool.map, config=config)
+
+    parts = [Part(i, record, r) for i, (record, r) in enumerate(zip(records, renderers))]
+    beds = []
+    for bed in report['beds']:
+        file_name = '{0}.{1}'.format(bed['name'], renderer.extension)
+        data, record = output.files[file_name]
+        bed_preview = output.files.get('{0}.png'.format(bed['name']), (None, None))[0] if preview else None
+        beds.append(Bed(bed['name'], renderer.extension, data, record, bed_preview))
+    return Result(parts, beds, report)
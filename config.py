@@ -1,3 +1,6 @@
+from copy import deepcopy
+
+
 class Config(object):
     font_file = '1CamBam_Stick_1.ttf'
 
@@ -21,3 +24,56 @@ class Config(object):
 
     min_edge_width = notch_depth + mat_thickness
 
+    # Machine speeds used to estimate job time, in mm/s keyed by color description
+    cut_speed = {
+        'CUT_THICK': 8.0,
+        'CUT_THIN': 20.0,
+        'ENGRAVE_THICK': 100.0,
+        'ENGRAVE_THIN': 150.0,
+    }
+    travel_speed = 300.0
+    pierce_time = .1  # seconds spent starting each path
+
+    preview_scale = 2  # pixels per mm in raster previews
+
+    face_order = 'bfs'  # 'bfs', 'morton' or 'none', the order faces and so edge indices are numbered in
+
+    packer = 'grid'  # 'grid' or 'rectpack'
+    packing_resolution = .01  # the grid packer works in whole multiples of this many mm
+    # parts whose areas are within this ratio of each other are packed in face order so neighbours share beds,
+    # 1 to pack strictly by area
+    packing_size_class_ratio = 1.25
+    # pack more parts than this in independent shards, 0 to always pack everything at once
+    packing_shard_size = 2000
+    packing_shard_compare = False  # also pack unsharded to report exactly how much utilization sharding lost
+
+    def __init__(self, **overrides):
+        """
+        A set of values to convert with, any not overridden are the class defaults at the time it is created.
+
+        Values derived from other values are derived again from the overrides unless they are overridden themselves.
+        Instances are passed down to everything that reads the config in place of the class, which only holds the
+        defaults.
+        """
+        # copied so changing an instance's speeds doesn't change every other config's
+        values = dict((key, deepcopy(getattr(Config, key))) for key in _keys())
+        for key, value in overrides.items():
+            if key not in values:
+                raise ValueError('Unknown config value {0}.'.format(key))
+            values[key] = deepcopy(value)
+        derived = [
+            ('notch_depth', lambda: values['mat_thickness']),
+            ('min_thickness', lambda: values['mat_thickness']),
+            ('snap_size', lambda: .25*values['mat_thickness']),
+            ('text_height', lambda: values['notch_depth'] + values['min_thickness']),
+            ('min_edge_width', lambda: values['notch_depth'] + values['mat_thickness']),
+        ]
+        for key, derive in derived:
+            if key not in overrides:
+                values[key] = derive()
+        for key, value in values.items():
+            setattr(self, key, value)
+
+
+def _keys():
+    return [key for key, value in vars(Config).items() if not key.startswith('_') and not callable(value)]
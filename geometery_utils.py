@@ -1,5 +1,6 @@
 import numpy as np
 
+from collections import deque
 from itertools import chain
 
 
@@ -134,6 +135,12 @@ def get_adjusted_points(polygon, t):
     return offset_polygon_2d(points_2d, offsets)
 
 
+def polygon_area_2d(points):
+    # shoelace formula, the same for either winding
+    x, y = np.asarray(points, dtype=float).T
+    return float(abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))) / 2.0
+
+
 def find_joint_offset(t, theta):
     if theta >= np.pi:
         # Only convex joints need to be offset
@@ -243,3 +250,56 @@ def merge_coplanar_faces(faces, face_normals):
         tracker.add(face, norm)
     return tracker.faces, tracker.normals
 
+
+def morton_order(points, bits=16):
+    # order of points along a z-order curve through their bounding box, nearby points end up near each other
+    points = np.asarray(points, dtype=float)
+    lower = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lower, 1e-12)
+    cells = np.minimum(((points - lower) / extent * (1 << bits)).astype(np.int64), (1 << bits) - 1)
+    codes = np.zeros(len(points), dtype=np.int64)
+    for bit in range(bits):
+        for axis in range(points.shape[1]):
+            codes |= ((cells[:, axis] >> bit) & 1) << (bit * points.shape[1] + axis)
+    return np.argsort(codes, kind='stable')
+
+
+def adjacency_order(faces, starts):
+    # breadth first order of faces across shared edges, each separate piece is started from its first face in starts
+    edge_to_faces = {}
+    for i, face in enumerate(faces):
+        for e in adjacent_nlets(face, 2):
+            edge_to_faces.setdefault(frozenset(indexable(e)), []).append(i)
+    visited = np.zeros(len(faces), dtype=bool)
+    order = []
+    for start in starts:
+        if visited[start]:
+            continue
+        visited[start] = True
+        queue = deque([start])
+        while queue:
+            i = queue.popleft()
+            order.append(i)
+            for e in adjacent_nlets(faces[i], 2):
+                for j in edge_to_faces[frozenset(indexable(e))]:
+                    if not visited[j]:
+                        visited[j] = True
+                        queue.append(j)
+    return order
+
+
+def reorder_faces(faces, face_normals, method='bfs'):
+    """
+    Reorder faces so neighbouring faces, and so the edge indices they are given, are close together.
+
+    method: 'morton' sorts face centroids along a z-order curve, 'bfs' walks across shared edges from the faces
+    first in z-order and 'none' keeps the mesh's order
+    """
+    if method == 'none' or not len(faces):
+        return faces, face_normals
+    order = morton_order([np.mean(face, axis=0) for face in faces])
+    if method == 'bfs':
+        order = adjacency_order(faces, order)
+    elif method != 'morton':
+        raise ValueError('Unknown face order {0}, expected bfs, morton or none.'.format(method))
+    return [faces[i] for i in order], [face_normals[i] for i in order]
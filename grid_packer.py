@@ -0,0 +1,296 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+class PackedRect(object):
+    # Mirrors the attributes of rectpack's packed rectangles so beds can be rendered from either packer
+    def __init__(self, x, y, width, height, rid):
+        self.x, self.y = x, y
+        self.width, self.height = width, height
+        self.rid = rid
+
+
+class MaxRectsBaf(object):
+    """MaxRects bin choosing the free rectangle with the best area fit, all coordinates are integers."""
+    def __init__(self, width, height, rotation=True):
+        self.width, self.height = width, height
+        self.rotation = rotation
+        # x, y, width, height of every maximal free rectangle
+        self._free = np.array([[0, 0, width, height]], dtype=np.int64)
+
+    def capacities(self):
+        # a w x h rectangle fits if and only if some capacity is at least w x h
+        return self._free[:, 2:]
+
+    def place(self, w, h):
+        """Place a w x h rectangle, returns its (x, y, width, height) or None if it doesn't fit."""
+        fx, fy, fw, fh = self._free.T
+        orientations = [(w, h), (h, w)] if self.rotation and w != h else [(w, h)]
+        best, best_score = None, None
+        for pw, ph in orientations:
+            fits = np.flatnonzero((fw >= pw) & (fh >= ph))
+            if not len(fits):
+                continue
+            # best area fit, ties broken by the shortest leftover side
+            score = (fw[fits] * fh[fits] - pw * ph) * (self.width + self.height) + \
+                np.minimum(fw[fits] - pw, fh[fits] - ph)
+            i = np.argmin(score)
+            if best_score is None or score[i] < best_score:
+                best, best_score = (fx[fits[i]], fy[fits[i]], pw, ph), score[i]
+        if best is not None:
+            self._split(*best)
+        return best
+
+    def occupy(self, x, y, w, h):
+        """Mark a rectangle that was placed some other way as used."""
+        self._split(x, y, w, h)
+
+    def _split(self, x, y, w, h):
+        free = self._free
+        fx, fy, fw, fh = free.T
+        hit = (fx < x + w) & (fx + fw > x) & (fy < y + h) & (fy + fh > y)
+        hx, hy, hw, hh = free[hit].T
+        # the up to four maximal rectangles left of, right of, below and above the placed rectangle
+        pieces = np.concatenate((
+            np.column_stack((hx, hy, x - hx, hh)),
+            np.column_stack((np.full_like(hx, x + w), hy, hx + hw - x - w, hh)),
+            np.column_stack((hx, hy, hw, y - hy)),
+            np.column_stack((hx, np.full_like(hy, y + h), hw, hy + hh - y - h)),
+        ))
+        pieces = pieces[(pieces[:, 2] > 0) & (pieces[:, 3] > 0)]
+        self._free = self._prune(free[~hit], pieces)
+
+    @staticmethod
+    def _prune(kept, pieces):
+        # kept rectangles never contain each other so only containment involving new pieces needs checking
+        def contains(outer, inner):
+            # [i, j] is whether outer[i] contains inner[j]
+            o, i = outer[:, np.newaxis], inner[np.newaxis, :]
+            return (o[..., 0] <= i[..., 0]) & (o[..., 1] <= i[..., 1]) & \
+                (o[..., 0] + o[..., 2] >= i[..., 0] + i[..., 2]) & (o[..., 1] + o[..., 3] >= i[..., 1] + i[..., 3])
+
+        among_pieces = contains(pieces, pieces)
+        # of identical pieces only keep the first
+        among_pieces &= ~np.tril(np.ones(among_pieces.shape, dtype=bool)) | \
+            ~np.all(pieces[:, np.newaxis] == pieces[np.newaxis], axis=2)
+        np.fill_diagonal(among_pieces, False)
+        pieces = pieces[~among_pieces.any(axis=0) & ~contains(kept, pieces).any(axis=0)]
+        kept = kept[~contains(pieces, kept).any(axis=0)]
+        return np.concatenate((kept, pieces))
+
+
+class SkylineBl(object):
+    """Skyline bin placing each rectangle as low as possible and then as far left, all coordinates are integers."""
+    def __init__(self, width, height, rotation=True):
+        self.width, self.height = width, height
+        self.rotation = rotation
+        # start, height and width of each skyline segment from left to right
+        self._x = np.array([0], dtype=np.int64)
+        self._y = np.array([0], dtype=np.int64)
+        self._w = np.array([width], dtype=np.int64)
+
+    def capacities(self):
+        # the width from the start of segment i to the end of segment j and the height left above the highest
+        # segment between them, a w x h rectangle fits if and only if some capacity is at least w x h
+        i = np.arange(len(self._x))
+        spanned = i[np.newaxis, :] >= i[:, np.newaxis]
+        heights = self.height - np.maximum.accumulate(np.where(spanned, self._y[np.newaxis, :], 0), axis=1)
+        widths = (self._x + self._w)[np.newaxis, :] - self._x[:, np.newaxis]
+        return np.column_stack((widths[spanned], heights[spanned]))
+
+    def place(self, w, h):
+        orientations = [(w, h), (h, w)] if self.rotation and w != h else [(w, h)]
+        best, best_key = None, None
+        for pw, ph in orientations:
+            # a rectangle starting at segment i rests on the highest segment it spans
+            spans = (np.arange(len(self._x))[np.newaxis, :] >= np.arange(len(self._x))[:, np.newaxis]) & \
+                    (self._x[np.newaxis, :] < self._x[:, np.newaxis] + pw)
+            y = np.where(spans, self._y[np.newaxis, :], -1).max(axis=1)
+            fits = np.flatnonzero((self._x + pw <= self.width) & (y + ph <= self.height))
+            if not len(fits):
+                continue
+            i = fits[np.lexsort((self._x[fits], y[fits] + ph))[0]]
+            key = (y[i] + ph, self._x[i])
+            if best_key is None or key < best_key:
+                best, best_key = (self._x[i], y[i], pw, ph), key
+        if best is not None:
+            self._raise(*best)
+        return best
+
+    def _raise(self, x, y, w, h):
+        end = x + w
+        segment_end = self._x + self._w
+        left = self._x < x
+        right = segment_end > end
+        # trim the segment sticking out to the right of the new one
+        right_x = np.maximum(self._x[right], end)
+        xs = np.concatenate((self._x[left], [x], right_x))
+        ys = np.concatenate((self._y[left], [y + h], self._y[right]))
+        ws = np.concatenate((self._w[left], [w], segment_end[right] - right_x))
+        # merge neighbouring segments at the same height
+        starts = np.concatenate(([True], ys[1:] != ys[:-1]))
+        self._x = xs[starts]
+        self._y = ys[starts]
+        self._w = np.add.reduceat(ws, np.flatnonzero(starts))
+
+
+PACK_ALGOS = {
+    'maxrects_baf': MaxRectsBaf,
+    'skyline_bl': SkylineBl,
+}
+
+
+def packing_order(sizes, size_class_ratio=1.0):
+    """
+    The order to pack rectangles in, largest area first.
+
+    With a size_class_ratio above 1 areas are grouped into classes that many times apart and rectangles in the same
+    class keep the order of their ids, so rectangles given in a meaningful order stay together.
+    """
+    sizes = np.asarray(sizes, dtype=float).reshape(-1, 2)
+    if size_class_ratio <= 1:
+        return np.argsort(-sizes[:, 0] * sizes[:, 1], kind='stable')
+    return np.lexsort((np.arange(len(sizes)), -_size_classes(sizes, size_class_ratio)))
+
+
+def _size_classes(sizes, size_class_ratio):
+    # larger classes hold larger rectangles
+    areas = np.asarray(sizes, dtype=float).reshape(-1, 2).prod(axis=1)
+    return np.floor(np.log(np.maximum(areas, 1e-9)) / np.log(size_class_ratio))
+
+
+def pack(sizes, bin_width, bin_height, pack_algo=MaxRectsBaf, rotation=True, size_class_ratio=1.0):
+    """
+    Offline pack integer sized rectangles into as many bins as needed, largest area first, each into the first bin
+    it fits in.
+
+    sizes: (n, 2) integer widths and heights, rectangle ids are their indices
+    size_class_ratio: see packing_order
+    Returns a list of bins, each a list of PackedRect in integer coordinates. Like rectpack, rectangles that are
+    larger than a bin are left out.
+    """
+    sizes = np.asarray(sizes, dtype=np.int64).reshape(-1, 2)
+    order = packing_order(sizes, size_class_ratio)
+    # no rectangle still to be placed is narrower than this, in either direction
+    min_side = np.minimum.accumulate(sizes[order].min(axis=1)[::-1])[::-1]
+    bins, placed = [], []
+    # the capacities of every bin at once, along with the bin each came from
+    capacities, capacity_bins = np.zeros((0, 2), dtype=np.int64), np.zeros(0, dtype=np.int64)
+    for rid, smallest in zip(order, min_side):
+        w, h = sizes[rid]
+        if not (w <= bin_width and h <= bin_height or rotation and h <= bin_width and w <= bin_height):
+            continue
+        cw, ch = capacities.T
+        fits = (cw >= w) & (ch >= h)
+        if rotation:
+            fits |= (cw >= h) & (ch >= w)
+        # use the first bin with room
+        b = capacity_bins[fits].min() if fits.any() else len(bins)
+        if b == len(bins):
+            bins.append(pack_algo(bin_width, bin_height, rotation=rotation))
+            placed.append([])
+        placed[b].append(PackedRect(*bins[b].place(w, h), rid=int(rid)))
+
+        # replace the bin's capacities, dropping any too small for what is left to place
+        updated = bins[b].capacities()
+        keep = capacity_bins != b
+        capacities = np.concatenate((capacities[keep], updated))
+        capacity_bins = np.concatenate((capacity_bins[keep], np.full(len(updated), b)))
+        useful = capacities.min(axis=1) >= smallest
+        capacities, capacity_bins = capacities[useful], capacity_bins[useful]
+    return placed
+
+
+def pack_best(sizes, bin_width, bin_height, pack_algos=tuple(PACK_ALGOS.values()), rotation=True,
+              size_class_ratio=1.0):
+    # pack with each algorithm and keep whichever needs the fewest bins
+    best_bins = None
+    for pack_algo in pack_algos:
+        bins = pack(sizes, bin_width, bin_height, pack_algo=pack_algo, rotation=rotation,
+                    size_class_ratio=size_class_ratio)
+        if best_bins is None or len(bins) < len(best_bins):
+            best_bins = bins
+    return best_bins
+
+
+def _pack_shard(args):
+    shard_sizes, bin_width, bin_height, pack_algos, rotation, size_class_ratio = args
+    return pack_best(shard_sizes, bin_width, bin_height, pack_algos=pack_algos, rotation=rotation,
+                     size_class_ratio=size_class_ratio)
+
+
+def _fill(b, sizes):
+    return sum(sizes[r.rid, 0] * sizes[r.rid, 1] for r in b)
+
+
+def pack_sharded(sizes, bin_width, bin_height, shard_size, pack_algos=tuple(PACK_ALGOS.values()), rotation=True,
+                 workers=None, consolidate_below=.75, compare=False, size_class_ratio=1.0):
+    """
+    Pack very large numbers of rectangles by packing shards of them independently in separate processes.
+
+    Rectangles are sorted by area and dealt out to the shards so every shard gets a similar mix of sizes. With a
+    size_class_ratio above 1 each size class is dealt out in contiguous chunks, keeping rectangles that are next to
+    each other in a class on the same shard.
+    Afterwards the rectangles of every bin filled less than consolidate_below, usually the last bin of each shard,
+    are packed again together.
+    Returns the bins like pack does and a dict describing the utilization of the result. When compare is set the
+    unsharded packing is run too so the utilization lost to sharding can be reported exactly, otherwise the loss is
+    reported against the fewest bins the total area could possibly fit in, baseline_bins and baseline_utilization
+    hold whichever was used and baseline names it. size_class_ratio is passed on to every packing, see packing_order.
+    """
+    sizes = np.asarray(sizes, dtype=np.int64).reshape(-1, 2)
+    order = packing_order(sizes, size_class_ratio)
+    shard_count = max(1, int(np.ceil(len(sizes) / float(shard_size))))
+    if size_class_ratio <= 1:
+        shards = [order[i::shard_count] for i in range(shard_count)]
+    else:
+        classes = _size_classes(sizes[order], size_class_ratio)
+        chunks = [[] for _ in range(shard_count)]
+        # array_split makes the first chunks one larger, the next class starts on the shard after the last of those
+        first = 0
+        for run in np.split(order, np.flatnonzero(np.diff(classes)) + 1):
+            for i, chunk in enumerate(np.array_split(run, shard_count)):
+                chunks[(first + i) % shard_count].append(chunk)
+            first = (first + len(run)) % shard_count
+        shards = [np.concatenate(c) for c in chunks]
+    jobs = [(sizes[shard], bin_width, bin_height, pack_algos, rotation, size_class_ratio) for shard in shards]
+    if shard_count == 1:
+        results = [_pack_shard(jobs[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_pack_shard, jobs))
+
+    bins = []
+    for shard, shard_bins in zip(shards, results):
+        for b in shard_bins:
+            # map shard local ids back to the original rectangles
+            bins.append([PackedRect(r.x, r.y, r.width, r.height, int(shard[r.rid])) for r in b])
+
+    bin_area = bin_width * bin_height
+    underfilled = [b for b in bins if _fill(b, sizes) < consolidate_below * bin_area]
+    if len(underfilled) > 1:
+        rids = np.array([r.rid for b in underfilled for r in b])
+        merged = [[PackedRect(r.x, r.y, r.width, r.height, int(rids[r.rid])) for r in b]
+                  for b in pack_best(sizes[rids], bin_width, bin_height, pack_algos=pack_algos, rotation=rotation,
+                                     size_class_ratio=size_class_ratio)]
+        if len(merged) < len(underfilled):
+            bins = [b for b in bins if _fill(b, sizes) >= consolidate_below * bin_area] + merged
+
+    total_area = float(sum(_fill(b, sizes) for b in bins))
+    baseline_bins = int(np.ceil(total_area / bin_area))
+    if compare:
+        baseline_bins = len(pack_best(sizes, bin_width, bin_height, pack_algos=pack_algos, rotation=rotation,
+                                      size_class_ratio=size_class_ratio))
+    utilization = total_area / (len(bins) * bin_area) if bins else 0.0
+    baseline_utilization = total_area / (baseline_bins * bin_area) if baseline_bins else 0.0
+    return bins, {
+        'shards': shard_count,
+        'bins': len(bins),
+        'utilization': utilization,
+        # what the loss is measured against, 'unsharded' packing or the 'area_bound'
+        'baseline': 'unsharded' if compare else 'area_bound',
+        'baseline_bins': baseline_bins,
+        'baseline_utilization': baseline_utilization,
+        'utilization_loss': baseline_utilization - utilization,
+    }
@@ -5,35 +5,42 @@ from renderer import *
 from geometery_utils import *
 from rectpack import PackingMode, PackingBin, newPacker, float2dec
 from rectpack import maxrects, skyline
-from render_polygon import render_polygon
+from grid_packer import PackedRect, pack_best, pack_sharded, packing_order
+from render_polygon import part_area, render_polygon
+from raster import preview_png
+from output import BundleOutput, DirectoryOutput
+from report import bed_report, job_report, write_report
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
 import numpy as np
 
 import sys
 
 
-def main(mesh_file, output_name, merge, render_panels, debug, individual, display_packing_boxes):
-    if debug:
-        renderer = DebugRenderer
+def load_faces(mesh_file, merge, fh=None, config=Config):
+    # fh reads the mesh from an open file instead, mesh_file is then only used to name it
+    src_mesh = mesh.Mesh.from_file(mesh_file, fh=fh)
+    return (src_mesh.vectors,) + prepare_faces(src_mesh.vectors, src_mesh.normals, merge, config)
+
+
+def prepare_faces(vectors, normals, merge, config=Config):
+    # vectors: (n, 3, 3) triangle vertices, normals: (n, 3) face normals
+    if merge:
+        faces, face_normals = merge_coplanar_faces(vectors, normals)
     else:
-        renderer = DXFRenderer
-        if os.path.exists(output_name):
-            print('output directory ({0}) already exists.'.format(output_name))
-            sys.exit(1)
-        os.mkdir(output_name)
+        faces, face_normals = list(map(list, vectors)), list(map(list, normals))
+    # edge indices are handed out in face order
+    return reorder_faces(faces, face_normals, config.face_order)
 
-    src_mesh = mesh.Mesh.from_file(mesh_file)
 
+def build_polygons(faces, face_normals):
     polys = []
     edge_to_edge_mate = {}
     edge_to_poly_mate = {}
     curr_index = 0
 
-    faces, face_normals = list(map(list, src_mesh.vectors)), list(map(list, src_mesh.normals))
-    if merge:
-        faces, face_normals = merge_coplanar_faces(src_mesh.vectors, src_mesh.normals)
-
     for face, face_normal in zip(faces, face_normals):
         unit_norm = normalized(face_normal)
         orig_poly = Polygon(
@@ -77,9 +84,12 @@ def main(mesh_file, output_name, merge, render_panels, debug, individual, displa
                 edge_to_edge_mate[edge.indexable()] = edge
                 edge_to_poly_mate[edge.indexable()] = orig_poly
         polys.append(orig_poly)
+    return polys
+
 
+def print_summary(vectors, polys):
     edge_lengths = set()
-    [edge_lengths.update([distance(v[0], v[1]), distance(v[1], v[2]), distance(v[2], v[0])]) for v in src_mesh.vectors]
+    [edge_lengths.update([distance(v[0], v[1]), distance(v[1], v[2]), distance(v[2], v[0])]) for v in vectors]
     print('================================')
     print('Outputting:\npolys: {0} \nmax edges: {1}\nmax edge length: {2}\nmin edge length: {3}'.format(
         len(polys),
@@ -89,66 +99,245 @@ def main(mesh_file, output_name, merge, render_panels, debug, individual, displa
     ))
     print('================================')
 
+
+def render_part(polygon, render_panels, config=Config):
+    r = PartRenderer(panels=render_panels, area=part_area(polygon, config), config=config)
+    render_polygon(r, polygon, render_panels, config=config)
+    return r.finish('')
+
+
+def pack_parts(boxes, config=Config):
+    # returns the bins of the packing that needs the fewest beds, rect ids index into boxes, along with the
+    # sharding stats if the parts were packed in shards
+    if config.packer == 'rectpack':
+        return _rectpack_parts(boxes, config), None
+    return _grid_pack_parts(boxes, config)
+
+
+def unpacked_parts(bins, boxes):
+    # indices of the parts too large to fit on a bed
+    return sorted(set(range(len(boxes))) - set(rect.rid for b in bins for rect in b))
+
+
+def print_packing(boxes, unpacked, sharding=None):
+    for rid in unpacked:
+        print('Part {0} ({1:.2f} x {2:.2f}) is larger than the bed.'.format(rid, boxes[rid].width, boxes[rid].height))
+    if sharding is not None:
+        print('Packed {0} shards into {1} beds at {2:.1%} utilization, {3:.1%} less than {4} ({5} beds).'.format(
+            sharding['shards'], sharding['bins'], sharding['utilization'], sharding['utilization_loss'],
+            'unsharded' if sharding['baseline'] == 'unsharded' else 'the area bound', sharding['baseline_bins']))
+
+
+def _grid_pack_parts(boxes, config):
+    resolution = config.packing_resolution
+    sizes = [box.int_rect(resolution) for box in boxes]
+    bed_size = int(config.bed_width / resolution + 1e-6), int(config.bed_height / resolution + 1e-6)
+    stats = None
+    if config.packing_shard_size and len(sizes) > config.packing_shard_size:
+        bins, stats = pack_sharded(sizes, *bed_size, shard_size=config.packing_shard_size,
+                                   compare=config.packing_shard_compare,
+                                   size_class_ratio=config.packing_size_class_ratio)
+    else:
+        bins = pack_best(sizes, *bed_size, size_class_ratio=config.packing_size_class_ratio)
+    return [[PackedRect(r.x * resolution, r.y * resolution, r.width * resolution, r.height * resolution, r.rid)
+             for r in b] for b in bins], stats
+
+
+def _rectpack_parts(boxes, config):
+    def size_class_sort(rects):
+        # rectpack sort_algo ordering (width, height, rid) tuples like the grid packer does
+        return [rects[i] for i in packing_order([r[:2] for r in rects], config.packing_size_class_ratio)]
+
+    best_packer = None
+    for pack_algo in [maxrects.MaxRectsBl, maxrects.MaxRectsBaf, skyline.SkylineMwf, skyline.SkylineBl]:
+        packer = newPacker(mode=PackingMode.Offline,
+                           pack_algo=pack_algo,
+                           bin_algo=PackingBin.BFF,
+                           sort_algo=size_class_sort,
+                           rotation=True)
+        for rid, box in enumerate(boxes):
+            packer.add_rect(*box.rect, rid=rid)
+        packer.add_bin(float2dec(config.bed_width, 2), float2dec(config.bed_height, 2), count=float('inf'))
+        packer.pack()
+        if best_packer is None or len(packer.bin_list()) < len(best_packer.bin_list()):
+            best_packer = packer
+    return [list(b) for b in best_packer]
+
+
+def bed_name(output_name, i, bed, polys):
+    indices = [e.index for rect in bed for e in polys[rect.rid].edges]
+    return '{0}-bed{1}_{2}_{3}'.format(output_name, i, min(indices), max(indices))
+
+
+def placement(rect, orig_box):
+    # packers round sizes up so whichever side the packed width is closest to tells if the part was rotated
+    if abs(float(rect.width) - orig_box.width) > abs(float(rect.width) - orig_box.height):
+        rot = np.pi/2
+    else:
+        rot = 0.0
+    delta = np.array([float(rect.x), float(rect.y)]) - rotate_cc_around_origin_2d(
+        orig_box.top_right if rot else orig_box.bottom_left, rot)
+    return delta, rot
+
+
+def part_records(polys):
+    # manifest records describing each part's edges and which parts its edges mate with
+    edge_to_part = dict((id(e), i) for i, p in enumerate(polys) for e in p.edges)
+    return [{
+        'part': i,
+        'edges': [e.index for e in p.edges],
+        'mates': [[e.index, edge_to_part[id(e.get_edge_mate)]] for e in p.edges if e.get_edge_mate is not None],
+    } for i, p in enumerate(polys)]
+
+
+def render_bed(r, bed, parts, display_packing_boxes=False, config=Config):
+    # returns the total area of the outlines of the parts drawn
+    # draw positioning frame
+    frame_width = config.bed_width - 2 * (config.padding - config.t)
+    frame_height = config.bed_height - 2 * (config.padding - config.t)
+    r.add_rectangle(np.array([0, 0]), frame_width, frame_height)
+
+    outline_area = 0.0
+    for rect in bed:
+        part = parts[rect.rid]
+        outline_area += part.area
+        delta, rot = placement(rect, part.box)
+        if display_packing_boxes:
+            box_points = [
+                [rect.x, rect.y], [rect.x + rect.width, rect.y], [rect.x + rect.width, rect.y + rect.height],
+                [rect.x, rect.y + rect.height]
+            ]
+            for a, b in adjacent_nlets(box_points, 2):
+                r.add_line(a, b, color=DEBUG)
+        part.replay(r, translation=delta, rotation=rot)
+        r.update()
+    return outline_area
+
+
+def write_bed(renderer, output, name, bed, parts, render_panels=True, optimize_paths=True, preview=False,
+              display_packing_boxes=False, records=None, config=Config):
+    # render a packed bed to output, or to the screen when there is no output, and return its report
+    bed_range = np.array([config.bed_width, config.bed_height])
+    r = renderer(panels=render_panels, axis_range=bed_range, optimize_paths=optimize_paths, config=config)
+    outline_area = render_bed(r, bed, parts, display_packing_boxes, config)
+    if output is None:
+        r.finish(name)
+        return bed_report(r.paths, outline_area, config=config)
+
+    data = r.to_bytes()
+    report = bed_report(r.paths, outline_area, config=config)
+    record = {'bed': name, 'report': report}
+    if records is not None:
+        record['parts'] = []
+        for rect in bed:
+            _, rot = placement(rect, parts[rect.rid].box)
+            record['parts'].append(dict(records[rect.rid], rotation=rot, bounding_box=[
+                float(rect.x), float(rect.y), float(rect.width), float(rect.height)]))
+    output.write('{0}.{1}'.format(name, r.extension), data, record)
+    # a png bed is its own preview
+    if preview and r.extension != 'png':
+        output.write('{0}.png'.format(name), preview_png(r.paths, bed_range, config), record)
+    return report
+
+
+def part_name(output_name, i, polygon):
+    return '{0}-part{1}-{2}'.format(output_name, i, '_'.join(str(e.index) for e in polygon.edges))
+
+
+def write_part(renderer, output, name, part, record, render_panels=True, config=Config):
+    # write a rendered part on its own in its own coordinates, the record gets the part's packing box
+    r = renderer(panels=render_panels, config=config)
+    part.replay(r)
+    box = part.box
+    output.write('{0}.{1}'.format(name, r.extension), r.to_bytes(), dict(record, bounding_box=[
+        float(box.bottom_left[0]), float(box.bottom_left[1]), float(box.width), float(box.height)]))
+
+
+def write_beds(renderer, output, output_name, polys, parts, records=None, render_panels=True, optimize_paths=True,
+               preview=False, display_packing_boxes=False, pool_map=map, write_parts=False, config=Config):
+    # pack the rendered parts onto beds, write every bed and the job report to output and return the report,
+    # write_parts also writes every part on its own along with the bed it was placed on
+    boxes = [part.box for part in parts]
+    bins, sharding = pack_parts(boxes, config)
+
+    def render_bed_file(i, bed):
+        name = bed_name(output_name, i, bed, polys)
+        report = write_bed(renderer, output, name, bed, parts,
+                           render_panels=render_panels, optimize_paths=optimize_paths, preview=preview,
+                           display_packing_boxes=display_packing_boxes, records=records, config=config)
+        return dict(report, name=name)
+
+    report = job_report(list(pool_map(render_bed_file, range(len(bins)), bins)), unpacked_parts(bins, boxes),
+                        sharding)
+    if output is not None and write_parts:
+        # parts too large for a bed aren't on one
+        part_beds = dict((rect.rid, bed['name']) for bed, b in zip(report['beds'], bins) for rect in b)
+
+        def write_part_file(i, polygon):
+            record = records[i] if records is not None else {'part': i}
+            write_part(renderer, output, part_name(output_name, i, polygon), parts[i],
+                       dict(record, bed=part_beds.get(i)), render_panels=render_panels, config=config)
+
+        list(pool_map(write_part_file, range(len(polys)), polys))
+    if output is not None:
+        write_report(report, output, '{0}-report'.format(output_name))
+    return report
+
+
+def main(mesh_file, output_name, merge, render_panels, debug, individual, display_packing_boxes,
+         optimize_paths=True, preview=False, renderer_name='dxf', workers=None, bundle=False):
+    if debug:
+        renderer = DebugRenderer
+        output = None
+    elif bundle:
+        renderer = get_renderer(renderer_name)
+        if os.path.exists('{0}.zip'.format(output_name)):
+            print('output bundle ({0}.zip) already exists.'.format(output_name))
+            sys.exit(1)
+        output = BundleOutput('{0}.zip'.format(output_name))
+    else:
+        renderer = get_renderer(renderer_name)
+        if os.path.exists(output_name):
+            print('output directory ({0}) already exists.'.format(output_name))
+            sys.exit(1)
+        os.mkdir(output_name)
+        output = DirectoryOutput(output_name)
+    # debug rendering is interactive and has to stay on the main thread
+    pool = None if debug else ThreadPoolExecutor(max_workers=workers)
+    pool_map = map if pool is None else pool.map
+
+    vectors, faces, face_normals = load_faces(mesh_file, merge)
+    polys = build_polygons(faces, face_normals)
+    print_summary(vectors, polys)
+
+    records = part_records(polys)
     if individual:
-        for i, orig_poly in enumerate(polys):
+        def render_individual(i, orig_poly):
             r = renderer()
             render_polygon(r, orig_poly, render_panels)
-            indices = [e.index for e in orig_poly.edges]
-            r.finish('{0}/{0}-tri{1}-{2}_{3}_{4}'.format(output_name, i, *indices))
+            name = '{0}-tri{1}-{2}_{3}_{4}'.format(output_name, i, *[e.index for e in orig_poly.edges])
+            if output is None:
+                r.finish(name)
+                return
+            data = r.to_bytes()
+            vertices = np.concatenate([path for _, path in r.paths])
+            output.write('{0}.{1}'.format(name, r.extension), data,
+                         dict(records[i], bounding_box=list(map(float, np.concatenate((
+                             vertices.min(axis=0), vertices.max(axis=0) - vertices.min(axis=0)))))))
+
+        list(pool_map(render_individual, range(len(polys)), polys))
     else:
-        best_packer = None
-        for pack_algo in [maxrects.MaxRectsBl, maxrects.MaxRectsBaf, skyline.SkylineMwf, skyline.SkylineBl]:
-            packer = newPacker(mode=PackingMode.Offline,
-                               pack_algo=pack_algo,
-                               bin_algo=PackingBin.BFF,
-                               rotation=True)
-            rid_to_box = {}
-            rid_to_poly = {}
-            i = 0
-            for orig_poly in polys:
-                r = PackingBoxRenderer()
-                render_polygon(r, orig_poly, render_panels)
-                box = r.finish('')
-                rid_to_box[i] = box
-                rid_to_poly[i] = orig_poly
-                packer.add_rect(*box.rect, rid=i)
-                i += 1
-            packer.add_bin(float2dec(Config.bed_width, 2), float2dec(Config.bed_height, 2), count=float('inf'))
-            packer.pack()
-            if best_packer is None or len(packer.bin_list()) < len(best_packer.bin_list()):
-                best_packer = packer
-
-        frame_width = Config.bed_width - 2 * (Config.padding - Config.t)
-        frame_height = Config.bed_height - 2 * (Config.padding - Config.t)
-        for i, b in enumerate(packer):
-            r = renderer(panels=render_panels, axis_range=np.array([Config.bed_width, Config.bed_height]))
-            # draw positioning frame
-            r.add_rectangle(np.array([0, 0]), frame_width, frame_height)
-
-            min_edge_index = float('inf')
-            max_edge_index = float('-inf')
-            for rect in b:
-                orig_box = rid_to_box[rect.rid]
-                orig_poly = rid_to_poly[rect.rid]
-                if rect.width != orig_box.rect[0]:
-                    rot = np.pi/2
-                else:
-                    rot = 0.0
-                delta = np.array([float(rect.x), float(rect.y)]) - rotate_cc_around_origin_2d(
-                    orig_box.top_right if rot else orig_box.bottom_left, rot)
-                if display_packing_boxes:
-                    box_points = [
-                        [rect.x, rect.y], [rect.x + rect.width, rect.y], [rect.x + rect.width, rect.y + rect.height],
-                        [rect.x, rect.y + rect.height]
-                    ]
-                    for a, b in adjacent_nlets(box_points, 2):
-                        r.add_line(a, b, color=DEBUG)
-                render_polygon(r, orig_poly, render_panels, translation=delta, rotation=rot)
-                r.update()
-
-                min_edge_index = min(min_edge_index, *[e.index for e in orig_poly.edges])
-                max_edge_index = max(max_edge_index, *[e.index for e in orig_poly.edges])
-            r.finish('{0}/{0}-bed{1}_{2}_{3}'.format(output_name, i, min_edge_index, max_edge_index))
+        parts = list(pool_map(lambda p: render_part(p, render_panels), polys))
+        report = write_beds(renderer, output, output_name, polys, parts, records, render_panels=render_panels,
+                            optimize_paths=optimize_paths, preview=preview,
+                            display_packing_boxes=display_packing_boxes, pool_map=pool_map, write_parts=bundle)
+        print_packing([part.box for part in parts], report['unpacked'], report.get('sharding'))
+        if output is None:
+            print(json.dumps(report, indent=2))
+    if output is not None:
+        output.close()
+    if pool is not None:
+        pool.shutdown()
 
 
 if __name__ == "__main__":
@@ -159,11 +348,44 @@ if __name__ == "__main__":
     parser.add_argument('--no_panels', action='store_true', help='Don\'t render panels.')
     parser.add_argument('--individual', action='store_true', help='Render each triangle individually.')
     parser.add_argument('--display_packing_boxes', action='store_true', help='Showing packing boxes.')
+    parser.add_argument('--no_path_optimization', action='store_true',
+                        help='Don\'t join and reorder bed lines to minimize laser travel.')
+    parser.add_argument('--preview', action='store_true', help='Write a .png thumbnail next to each bed.')
+    # interactive renderers don't write files, --debug is the way to use them
+    parser.add_argument('--renderer', default='dxf',
+                        choices=sorted(name for name, r in RENDERERS.items() if r.extension is not None),
+                        help='Output backend.')
+    parser.add_argument('--workers', type=int, help='Number of threads to render with.')
+    parser.add_argument('--bundle', action='store_true',
+                        help='Write the beds and a file for every part into a single .zip with a manifest instead of a '
+                             'directory.')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and update the output whenever the mesh or config.py change.')
     args = parser.parse_args()
+    if args.watch:
+        unsupported = [flag for flag in ('debug', 'individual', 'bundle', 'display_packing_boxes')
+                       if getattr(args, flag)]
+        if unsupported:
+            parser.error('--watch can\'t be combined with {0}.'.format(', '.join('--' + f for f in unsupported)))
+        from watch import Watcher
+        Watcher(args.mesh_file,
+                args.mesh_file.split("/")[-1].split(".")[0],
+                not args.no_merge,
+                not args.no_panels,
+                not args.no_path_optimization,
+                args.preview,
+                args.renderer,
+                args.workers).run()
+        sys.exit(0)
     main(args.mesh_file,
          args.mesh_file.split("/")[-1].split(".")[0],
          not args.no_merge,
          not args.no_panels,
          args.debug,
          args.individual,
-         args.display_packing_boxes)
+         args.display_packing_boxes,
+         not args.no_path_optimization,
+         args.preview,
+         args.renderer,
+         args.workers,
+         args.bundle)
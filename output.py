@@ -0,0 +1,81 @@
+from collections import OrderedDict
+import json
+import os
+import threading
+import time
+import zipfile
+
+
+class DirectoryOutput(object):
+    """Writes each output file into a directory."""
+    def __init__(self, directory):
+        self.directory = directory
+
+    def write(self, name, data, record=None):
+        with open(os.path.join(self.directory, name), 'wb') as f:
+            f.write(data)
+
+    def close(self):
+        pass
+
+
+class MemoryOutput(object):
+    """Keeps every output file in memory, files maps names to (data, record) in the order they were written."""
+    def __init__(self):
+        self.files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def write(self, name, data, record=None):
+        with self._lock:
+            self.files[name] = (data, record)
+
+    def close(self):
+        pass
+
+
+class BundleOutput(object):
+    """
+    Streams every output file into a single zip archive along with a JSON manifest.
+
+    path: where to write the archive, or a writable file object which doesn't have to be seekable
+
+    Each entry's manifest record is written to manifest/<name>.json right after the entry and flushed with it, so
+    everything finished before a run dies can still be recovered by scanning the local headers. The zip's central
+    directory and manifest.json, the whole manifest in one entry, are only written when the bundle is closed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._zip = zipfile.ZipFile(path, 'w')
+        self._manifest = {}
+        # rendering happens on several threads but zip entries have to be written one at a time
+        self._lock = threading.Lock()
+
+    def write(self, name, data, record=None):
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        # pngs are already compressed
+        info.compress_type = zipfile.ZIP_STORED if name.endswith('.png') else zipfile.ZIP_DEFLATED
+        with self._lock:
+            self._zip.writestr(info, data)
+            if record is not None:
+                self._zip.writestr('manifest/{0}.json'.format(name), json.dumps(record),
+                                   compress_type=zipfile.ZIP_DEFLATED)
+            self._zip.fp.flush()
+            self._manifest[name] = record
+
+    def close(self):
+        with self._lock:
+            self._zip.writestr('manifest.json', json.dumps({'entries': self._manifest}, indent=2),
+                               compress_type=zipfile.ZIP_DEFLATED)
+            self._zip.close()
+
+
+class QueueOutput(object):
+    """Hands every output file to a queue as soon as it is written, closing puts None."""
+    def __init__(self, queue):
+        self._queue = queue
+
+    def write(self, name, data, record=None):
+        self._queue.put((name, data, record))
+
+    def close(self):
+        self._queue.put(None)
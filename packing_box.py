@@ -16,6 +16,10 @@ class PackingBox(object):
     def rect(self):
         return float2dec(self.width, 2), float2dec(self.height, 2)
 
+    def int_rect(self, resolution):
+        # width and height in whole multiples of resolution, rounded up so packed boxes never overlap
+        return int(np.ceil(self.width / resolution)), int(np.ceil(self.height / resolution))
+
     @property
     def points(self):
         return self._points
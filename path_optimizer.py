@@ -0,0 +1,219 @@
+import math
+
+import numpy as np
+
+from color import *
+
+# Engrave before cutting, and cut panels before the pieces that hold them, so that nothing drops out of the sheet
+# before the work inside of it is done
+COLOR_ORDER = [FRAME, ENGRAVE_THIN, ENGRAVE_THICK, CUT_THIN, CUT_THICK, DEBUG]
+
+# Maximum number of following paths considered when reversing a run of paths during 2-opt
+TWO_OPT_WINDOW = 64
+TWO_OPT_PASSES = 8
+# Maximum number of grid rings searched before falling back to a brute force nearest neighbor search
+MAX_SEARCH_RINGS = 4
+
+
+def optimize_paths(segments, colors, origin=(0.0, 0.0)):
+    """
+    Chain line segments into polylines and order them to minimize the laser's travel between them.
+
+    segments: array like of shape (n, 2, 2) holding the end points of each segment
+    colors: the Color of each segment
+    Returns a list of (color, polyline) tuples in cutting order where each polyline is an (m, 2) array.
+    """
+    segments = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+    colors = list(colors)
+    ordered = []
+    position = np.asarray(origin, dtype=float)
+    for color in _color_order(colors):
+        mask = np.array([c is color for c in colors], dtype=bool)
+        ordered.extend((color, polyline) for polyline in order_polylines(chain_segments(segments[mask]), position))
+        position = ordered[-1][1][-1]
+    return ordered
+
+
+def order_paths(paths, origin=(0.0, 0.0)):
+    """Order and orient (color, polyline) tuples like optimize_paths without joining them."""
+    ordered = []
+    position = np.asarray(origin, dtype=float)
+    for color in _color_order([c for c, _ in paths]):
+        polylines = [polyline for c, polyline in paths if c is color]
+        ordered.extend((color, polyline) for polyline in order_polylines(polylines, position))
+        position = ordered[-1][1][-1]
+    return ordered
+
+
+def _color_order(colors):
+    # the colors present in cutting order, unknown colors last
+    present = dict.fromkeys(colors)
+    return [c for c in COLOR_ORDER if c in present] + [c for c in present if c not in COLOR_ORDER]
+
+
+def travel_length(paths, origin=(0.0, 0.0)):
+    """Total distance travelled with the laser off when cutting the (color, polyline) tuples in order."""
+    if not paths:
+        return 0.0
+    entries = np.array([p[0] for _, p in paths])
+    exits = np.array([np.asarray(origin, dtype=float)] + [p[-1] for _, p in paths[:-1]])
+    return float(np.linalg.norm(entries - exits, axis=1).sum())
+
+
+def chain_segments(segments, decimals=6):
+    """Join segments that share end points into continuous polylines."""
+    n = len(segments)
+    if n == 0:
+        return []
+    # segment ends that round to the same point are treated as the same node
+    nodes, node_ids = np.unique(np.round(segments.reshape(-1, 2), decimals), axis=0, return_inverse=True)
+    node_ids = node_ids.reshape(-1, 2)
+
+    # compressed incidence lists: the segment ends touching each node
+    ends = np.argsort(node_ids.ravel(), kind='stable')
+    offsets = np.searchsorted(node_ids.ravel()[ends], np.arange(len(nodes) + 1))
+    cursor = offsets[:-1].copy()
+    used = np.zeros(n, dtype=bool)
+    ends, offsets, node_list = ends.tolist(), offsets.tolist(), node_ids.tolist()
+    cursor = cursor.tolist()
+
+    def walk(node):
+        walked = []
+        while True:
+            while cursor[node] < offsets[node + 1] and used[ends[cursor[node]] // 2]:
+                cursor[node] += 1
+            if cursor[node] == offsets[node + 1]:
+                return walked
+            end = ends[cursor[node]]
+            used[end // 2] = True
+            node = node_list[end // 2][1 - end % 2]
+            walked.append(node)
+
+    polylines = []
+    for i in range(n):
+        if used[i]:
+            continue
+        used[i] = True
+        a, b = node_list[i]
+        forward = walk(b)
+        backward = walk(a)
+        polylines.append(nodes[backward[::-1] + [a, b] + forward])
+    return polylines
+
+
+class _GridIndex(object):
+    def __init__(self, points, cell_size):
+        self._points = points
+        self._coords = points.tolist()
+        self._cell_size = cell_size
+        self._alive = [True] * len(points)
+        self._remaining = len(points)
+        cells = np.floor(points / cell_size).astype(np.int64)
+        self._buckets = {}
+        for i, cell in enumerate(map(tuple, cells.tolist())):
+            self._buckets.setdefault(cell, []).append(i)
+
+    def remove(self, i):
+        if self._alive[i]:
+            self._alive[i] = False
+            self._remaining -= 1
+
+    def nearest(self, point):
+        if not self._remaining:
+            return None
+        px, py = point
+        cx, cy = math.floor(px / self._cell_size), math.floor(py / self._cell_size)
+        best, best_distance = None, np.inf
+        for ring in range(MAX_SEARCH_RINGS + 1):
+            for cell in self._ring(cx, cy, ring):
+                bucket = self._buckets.get(cell)
+                if not bucket:
+                    continue
+                bucket[:] = [i for i in bucket if self._alive[i]]
+                for i in bucket:
+                    x, y = self._coords[i]
+                    d = math.hypot(x - px, y - py)
+                    if d < best_distance:
+                        best, best_distance = i, d
+            # every point in the next ring is at least this far away
+            if best is not None and best_distance <= ring * self._cell_size:
+                return best
+        alive = np.flatnonzero(self._alive)
+        return alive[np.argmin(np.linalg.norm(self._points[alive] - point, axis=1))]
+
+    @staticmethod
+    def _ring(cx, cy, ring):
+        if ring == 0:
+            yield cx, cy
+            return
+        for dx in range(-ring, ring + 1):
+            yield cx + dx, cy - ring
+            yield cx + dx, cy + ring
+        for dy in range(-ring + 1, ring):
+            yield cx - ring, cy + dy
+            yield cx + ring, cy + dy
+
+
+def order_polylines(polylines, origin=(0.0, 0.0)):
+    """Order and orient polylines with a nearest neighbor tour refined by 2-opt, starting from origin."""
+    n = len(polylines)
+    if n == 0:
+        return []
+    # point 2 * i is the start of polyline i and 2 * i + 1 is its end
+    points = np.array([p for polyline in polylines for p in (polyline[0], polyline[-1])], dtype=float)
+    extent = np.ptp(points, axis=0).max()
+    index = _GridIndex(points, max(extent / np.sqrt(n), 1e-6))
+
+    order, flipped = [], []
+    position = np.asarray(origin, dtype=float)
+    for _ in range(n):
+        nearest = index.nearest(position)
+        i, is_end = nearest // 2, nearest % 2
+        index.remove(2 * i)
+        index.remove(2 * i + 1)
+        order.append(i)
+        flipped.append(bool(is_end))
+        position = points[2 * i + 1 - is_end]
+
+    order, flipped = _two_opt(points, np.array(order), np.array(flipped), np.asarray(origin, dtype=float))
+    return [polylines[i][::-1] if flip else polylines[i] for i, flip in zip(order, flipped)]
+
+
+def _two_opt(points, order, flipped, origin):
+    # entry and exit points of each path in tour order, led by a fixed zero length path at the origin
+    entries = np.vstack([origin, points[2 * order + flipped]])
+    exits = np.vstack([origin, points[2 * order + 1 - flipped]])
+    n = len(entries)
+    # reversing the run of paths i + 1 through j = i + k reverses the direction each of them is cut in,
+    # trading travel exits[i] -> entries[i + 1] and exits[j] -> entries[j + 1]
+    # for exits[i] -> exits[j] and entries[i + 1] -> entries[j + 1]
+    i = np.arange(n - 1)[:, np.newaxis]
+    j = i + np.arange(1, TWO_OPT_WINDOW + 1)[np.newaxis, :]
+    valid = j < n
+    j = np.minimum(j, n - 1)
+    has_next = j + 1 < n
+    following = np.minimum(j + 1, n - 1)
+    for _ in range(TWO_OPT_PASSES):
+        def dist(u, v):
+            return np.hypot(u[..., 0] - v[..., 0], u[..., 1] - v[..., 1])
+
+        old = dist(exits[i], entries[i + 1]) + np.where(has_next, dist(exits[j], entries[following]), 0.0)
+        new = dist(exits[i], exits[j]) + np.where(has_next, dist(entries[i + 1], entries[following]), 0.0)
+        gains = np.where(valid, old - new, 0.0)
+        best = np.argmax(gains, axis=1)
+        best_gains = gains[np.arange(n - 1), best]
+        candidates = np.flatnonzero(best_gains > 1e-9)
+        if not len(candidates):
+            break
+        # apply the largest improvements first, skipping any that touch a run that was already reversed
+        touched = np.zeros(n + 1, dtype=bool)
+        for start in candidates[np.argsort(-best_gains[candidates])]:
+            end = j[start, best[start]]
+            if touched[start:end + 2].any():
+                continue
+            touched[start:end + 2] = True
+            span = slice(start + 1, end + 1)
+            entries[span], exits[span] = exits[span][::-1].copy(), entries[span][::-1].copy()
+            order[start:end] = order[start:end][::-1]
+            flipped[start:end] = ~flipped[start:end][::-1]
+    return order, flipped
@@ -25,6 +25,13 @@ class Polygon(object):
     def points(self):
         return [e.point_a for e in self.edges]
 
+    def signature(self):
+        # everything render_polygon reads, two polygons with the same signature render identically
+        return tuple(self.unit_norm), tuple(
+            (tuple(e.point_a), tuple(e.point_b), tuple(e.angles), e.index, e._edge_type, e.get_edge_angle,
+             tuple(e.get_edge_mate.angles) if e.get_edge_mate is not None else None)
+            for e in self.edges)
+
     def flatten_point(self, point):
         ret = self.flatten_matrix.dot(point)
         return ret
@@ -0,0 +1,68 @@
+import struct
+import zlib
+
+import numpy as np
+
+from config import Config
+
+
+def rasterize(paths, axis_range=None, scale=None, config=Config):
+    """
+    Draw (color, polyline) tuples into an RGB image buffer without going through matplotlib.
+
+    axis_range: the (width, height) in mm drawn from the origin, defaults to the bounds of the paths
+    scale: pixels per mm, defaults to config.preview_scale
+    """
+    if scale is None:
+        scale = config.preview_scale
+    vertices = np.concatenate([polyline for _, polyline in paths]) if paths else np.zeros((0, 2))
+    if axis_range is not None:
+        lower, upper = np.zeros(2), np.asarray(axis_range, dtype=float)
+    elif len(vertices):
+        lower, upper = vertices.min(axis=0) - config.padding, vertices.max(axis=0) + config.padding
+    else:
+        lower, upper = np.zeros(2), np.ones(2)
+    width, height = np.maximum(np.ceil((upper - lower) * scale).astype(int), 1)
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    if not len(vertices):
+        return image
+
+    # flatten every polyline into one array of segments, dropping the ones that would join two polylines
+    path_ids = np.repeat(np.arange(len(paths)), [len(polyline) for _, polyline in paths])
+    rgb = np.array([(color.r, color.g, color.b) for color, _ in paths], dtype=np.uint8)
+    pixels = (vertices - lower) * scale
+    joined = path_ids[1:] == path_ids[:-1]
+    a, b, segment_colors = pixels[:-1][joined], pixels[1:][joined], rgb[path_ids[1:][joined]]
+
+    # sample every segment at least once per pixel along its longest axis
+    samples = np.ceil(np.abs(b - a).max(axis=1)).astype(int) + 1
+    segment_ids = np.repeat(np.arange(len(a)), samples)
+    starts = np.cumsum(samples) - samples
+    t = (np.arange(len(segment_ids)) - starts[segment_ids]) / np.maximum(samples - 1, 1)[segment_ids]
+    points = a[segment_ids] + t[:, np.newaxis] * (b - a)[segment_ids]
+    x = np.clip(np.round(points[:, 0]).astype(int), 0, width - 1)
+    # image rows run top to bottom
+    y = np.clip(height - 1 - np.round(points[:, 1]).astype(int), 0, height - 1)
+    # later paths are drawn over earlier ones, matching the order they are emitted in
+    image[y, x] = segment_colors[segment_ids]
+    return image
+
+
+def encode_png(image):
+    height, width, _ = image.shape
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    # every scanline starts with a zero byte selecting no filter
+    scanlines = np.hstack((np.zeros((height, 1), dtype=np.uint8), image.reshape(height, width * 3)))
+    return b''.join((
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(scanlines.tobytes(), 6)),
+        chunk(b'IEND', b''),
+    ))
+
+
+def preview_png(paths, axis_range=None, config=Config):
+    return encode_png(rasterize(paths, axis_range, config=config))
@@ -5,9 +5,14 @@ from geometery_utils import *
 import numpy as np
 
 
-def render_polygon(r, polygon, render_panels, translation=np.array([0, 0]), rotation=0.0):
-    adjusted_points = get_adjusted_points(polygon, Config.mat_thickness + Config.snap_size)
-    cutout_width = Config.notch_depth + Config.min_thickness
+def part_area(polygon, config=Config):
+    # area inside the part's edges, ignoring the small notches and joints along them
+    return polygon_area_2d(get_adjusted_points(polygon, config.mat_thickness + config.snap_size))
+
+
+def render_polygon(r, polygon, render_panels, translation=np.array([0, 0]), rotation=0.0, config=Config):
+    adjusted_points = get_adjusted_points(polygon, config.mat_thickness + config.snap_size)
+    cutout_width = config.notch_depth + config.min_thickness
 
     def render_cutout():
         cutout = [rotate_cc_around_origin_2d(p, rotation) + translation for p in
@@ -33,35 +38,35 @@ def render_polygon(r, polygon, render_panels, translation=np.array([0, 0]), rota
         base_cs = CoordinateSystem2D(normalized(b - a), normal(b, a))
 
         def render_joint(joint_point):
-            joint_point += base_cs.down(2 * Config.t)
+            joint_point += base_cs.down(2 * config.t)
             r.set_draw_point(joint_point)
             # reduce angles from 0 - 360 to 0 - 180 for simplicity
             joint_angle = edge.get_edge_angle if not edge.is_concave else 2 * np.pi - edge.get_edge_angle
-            joint_width = Config.mat_thickness - 2 * Config.t
-            joint_depth = cutout_width - Config.notch_depth
+            joint_width = config.mat_thickness - 2 * config.t
+            joint_depth = cutout_width - config.notch_depth
 
             rot_cs = base_cs.rotated(np.pi / 2.0 - joint_angle)
 
             def draw_fit_joint():
                 def draw_fit(cs):
-                    r.draw(cs.up(.5*Config.snap_size))
-                    r.draw(cs.up(.5*Config.snap_size) + cs.left(.5*Config.snap_size))
-                    r.draw(cs.left(joint_depth - .5*Config.snap_size))
+                    r.draw(cs.up(.5*config.snap_size))
+                    r.draw(cs.up(.5*config.snap_size) + cs.left(.5*config.snap_size))
+                    r.draw(cs.left(joint_depth - .5*config.snap_size))
                     r.draw(cs.up(joint_width))
-                    r.draw(cs.right(joint_depth - .5*Config.snap_size))
-                    r.draw(cs.up(.5*Config.snap_size) + cs.right(.5*Config.snap_size))
-                    r.draw(cs.up(Config.snap_size - .5*Config.snap_size))
+                    r.draw(cs.right(joint_depth - .5*config.snap_size))
+                    r.draw(cs.up(.5*config.snap_size) + cs.right(.5*config.snap_size))
+                    r.draw(cs.up(config.snap_size - .5*config.snap_size))
 
-                long_edge = joint_depth + Config.min_thickness + (joint_width + Config.snap_size) / np.tan(
+                long_edge = joint_depth + config.min_thickness + (joint_width + config.snap_size) / np.tan(
                     joint_angle / 2.0)
-                short_edge = joint_depth + Config.min_thickness - Config.snap_size / np.tan(joint_angle / 2.0)
+                short_edge = joint_depth + config.min_thickness - config.snap_size / np.tan(joint_angle / 2.0)
 
                 paper_joint_offset = 1.5 * cutout_width
 
                 # add index text
-                r.add_text(joint_point + base_cs.down(Config.text_offset) + base_cs.left(joint_depth),
+                r.add_text(joint_point + base_cs.down(config.text_offset) + base_cs.left(joint_depth),
                            -1 * base_cs.x_vector, str(edge.index),
-                           long_edge - (cutout_width - joint_depth) - Config.text_offset,
+                           long_edge - (cutout_width - joint_depth) - config.text_offset,
                            joint_width)
 
                 r.move(base_cs.right(joint_width / 2.0))
@@ -70,8 +75,8 @@ def render_polygon(r, polygon, render_panels, translation=np.array([0, 0]), rota
                 r.draw(rot_cs.down(long_edge))
 
                 draw_fit(rot_cs.rotated(-.5 * np.pi))
-                r.draw(rot_cs.up(short_edge), tab=Config.attachment_tab)
-                r.draw(base_cs.right(short_edge), tab=Config.attachment_tab)
+                r.draw(rot_cs.up(short_edge), tab=config.attachment_tab)
+                r.draw(base_cs.right(short_edge), tab=config.attachment_tab)
                 draw_fit(base_cs)
 
             draw_fit_joint()
@@ -88,7 +93,7 @@ def render_polygon(r, polygon, render_panels, translation=np.array([0, 0]), rota
             return bias_from_left
 
         def render_edge():
-            notch_width = Config.mat_thickness - 2 * Config.t
+            notch_width = config.mat_thickness - 2 * config.t
             # joint center needs to be positioned respective to the original side otherwise
             # mating joints will not line up properly depending on their respective offsets
             # pick the joint point biased towards the centers of the offset polygon edges
@@ -97,13 +102,13 @@ def render_polygon(r, polygon, render_panels, translation=np.array([0, 0]), rota
             if distance(a, joint_center) + notch_width / 2.0 > distance(a, b):
                 print('Joint is falling off the end of the edge.')
             r.set_draw_point(a)
-            r.draw_to(joint_center + base_cs.left(.5 * notch_width - Config.snap_size - Config.t),
-                      tab=Config.attachment_tab)
-            r.draw(base_cs.right(.5*Config.snap_size) + base_cs.up(.5*Config.snap_size))
-            r.draw(base_cs.up(Config.notch_depth - .5*Config.snap_size))
-            r.draw(base_cs.right(notch_width - 2*Config.t))
-            r.draw(base_cs.down(Config.notch_depth - .5*Config.snap_size))
-            r.draw(base_cs.right(.5*Config.snap_size) + base_cs.down(.5*Config.snap_size))
+            r.draw_to(joint_center + base_cs.left(.5 * notch_width - config.snap_size - config.t),
+                      tab=config.attachment_tab)
+            r.draw(base_cs.right(.5*config.snap_size) + base_cs.up(.5*config.snap_size))
+            r.draw(base_cs.up(config.notch_depth - .5*config.snap_size))
+            r.draw(base_cs.right(notch_width - 2*config.t))
+            r.draw(base_cs.down(config.notch_depth - .5*config.snap_size))
+            r.draw(base_cs.right(.5*config.snap_size) + base_cs.down(.5*config.snap_size))
             joint_point = r.get_draw_point()
             r.draw_to(b)
 
@@ -111,24 +116,24 @@ def render_polygon(r, polygon, render_panels, translation=np.array([0, 0]), rota
                 render_joint(joint_point)
 
         def render_text():
-            text_point = mid + base_cs.right(Config.mat_thickness / 2.0 + Config.text_offset) + \
-                         base_cs.up(Config.text_offset)
+            text_point = mid + base_cs.right(config.mat_thickness / 2.0 + config.text_offset) + \
+                         base_cs.up(config.text_offset)
             r.add_text(text_point, b - a,
                        str(edge.index) + ('c' if edge.is_concave else ''),
-                       distance(b, text_point) - Config.text_offset, Config.text_height - 2 * Config.text_offset)
+                       distance(b, text_point) - config.text_offset, config.text_height - 2 * config.text_offset)
 
         def render_panel_edge():
-            r.add_line(a_orig, b_orig, color=CUT_THIN, tab=2 * Config.attachment_tab)
+            r.add_line(a_orig, b_orig, color=CUT_THIN, tab=2 * config.attachment_tab)
 
         def render_panel_guide():
             r.add_line(a + base_cs.left(1), a + base_cs.right(1), color=ENGRAVE_THIN)
             r.add_line(b + base_cs.left(1), b + base_cs.right(1), color=ENGRAVE_THIN)
 
         def render_panel_text():
-            text_point = midpoint(a_orig, b_orig) + base_cs.up(Config.text_offset)
+            text_point = midpoint(a_orig, b_orig) + base_cs.up(config.text_offset)
             r.add_text(text_point, b_orig - a_orig,
                        str(edge.index),
-                       distance(b, text_point) - Config.text_offset, Config.text_height, ENGRAVE_THIN,
+                       distance(b, text_point) - config.text_offset, config.text_height, ENGRAVE_THIN,
                        h_center=True)
 
         if render_panels:
@@ -144,6 +149,6 @@ def render_polygon(r, polygon, render_panels, translation=np.array([0, 0]), rota
             if render_panels:
                 render_panel_text()
 
-            if width < Config.min_edge_width:
+            if width < config.min_edge_width:
                 print('Side with length {0} is shorter than minimum length {1}'.format(
-                    width, Config.min_edge_width))
+                    width, config.min_edge_width))
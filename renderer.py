@@ -1,6 +1,13 @@
+from abc import ABC, abstractmethod
+from functools import lru_cache
+import io
+
 from matplotlib import transforms
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from matplotlib.lines import Line2D
+from matplotlib.ticker import NullLocator
 from matplotlib.text import TextPath
 from matplotlib.font_manager import FontProperties
 from matplotlib import patches
@@ -11,22 +18,91 @@ import numpy as np
 from color import *
 from geometery_utils import *
 from packing_box import PackingBox
+from path_optimizer import optimize_paths, order_paths
+from raster import preview_png
+
+
+RENDERERS = {}
+
+
+def register_renderer(name):
+    def register(renderer):
+        RENDERERS[name] = renderer
+        return renderer
+    return register
+
+
+def get_renderer(name):
+    try:
+        return RENDERERS[name]
+    except KeyError:
+        raise ValueError('Unknown renderer {0}, expected one of {1}.'.format(name, sorted(RENDERERS)))
+
+
+@lru_cache(maxsize=4096)
+def _glyph_path(font_file, text):
+    # laying text out is slow and the same indices come up again and again, paths are never modified in place
+    return TextPath([0, 0], text, font_properties=FontProperties(fname=font_file))
 
 
-class _MatPlotLibRenderer:
-    def __init__(self, panels=True, axis_range=None):
-        plt.axes().set_aspect('equal')
-        self._ax = plt.subplot(111)
+def _text_path(font_file, a, v, text, max_w, max_h, h_center=False, v_center=False):
+    text_path = _glyph_path(font_file, text)
+    bb = text_path.get_extents()
+    h_adjust, v_adjust = 0, 0
+    if h_center:
+        h_adjust = -(bb.xmin + bb.xmax) / 2
+    if v_center:
+        v_adjust = -(bb.ymin + bb.ymax) / 2
+    text_path = text_path.transformed(
+        transforms.Affine2D().translate(h_adjust, v_adjust)
+    )
+    x_scale = max_w / (bb.xmax - bb.xmin)
+    y_scale = max_h / (bb.ymax - bb.ymin)
+    return text_path.transformed(
+        transforms.Affine2D()
+            # align text with the respective side
+            .rotate(vector_angle_2d(v))
+            # make text as large as will fit in x and y bounds
+            .scale(min(x_scale, y_scale))
+            # move the text to the text point
+            .translate(a[0], a[1])
+    )
+
+
+class _Renderer(ABC):
+    # Renderers own all of their drawing state so that separate instances can be used from separate threads
+    # file extension of the output of renderers that produce files
+    extension = None
+
+    def __init__(self, panels=True, axis_range=None, optimize_paths=False, config=Config):
+        self._config = config
         self._colors = set()
+        self._segments = []
+        # (color, polyline) tuples of text waiting to be ordered along with the lines
+        self._text_polylines = []
+        self._optimize_paths = optimize_paths
+        # (color, polyline) tuples for everything drawn so far, patches are emitted before lines
+        self._patch_paths = []
+        self._line_paths = []
         self._axis_range = axis_range
         self._curr_draw_point = None
-        if axis_range is not None:
-            self._ax.set_xlim(left=0, right=axis_range[0])
-            self._ax.set_ylim(bottom=0, top=axis_range[1])
 
-    @staticmethod
-    def _convert_color(color):
-        return color.r / 255.0, color.g / 255.0, color.b / 255.0
+    @abstractmethod
+    def update(self):
+        pass
+
+    @abstractmethod
+    def finish(self, name):
+        pass
+
+    def _draw_path(self, color, path):
+        pass
+
+    def _draw_circle(self, a, d, color):
+        pass
+
+    def _draw_text_path(self, text_path, color):
+        pass
 
     def add_line(self, a, b, color=CUT_THICK, tab=0.0):
         if tab > 0:
@@ -35,7 +111,35 @@ class _MatPlotLibRenderer:
             self.add_line(a, mid - tab/2.0*normalized(mid - a), color=color)
             return self.add_line(mid + tab/2.0*normalized(mid - a), b, color=color)
         self._colors.add(color)
-        self._ax.plot([a[0], b[0]], [a[1], b[1]], color=self._convert_color(color))
+        # copy the end points, the draw point is moved in place
+        self._segments.append((np.array(a, dtype=float), np.array(b, dtype=float), color))
+
+    def _flush_lines(self):
+        # lines are buffered so that they can be joined and ordered before being drawn, text is ordered too but
+        # still drawn before any lines
+        position = np.zeros(2)
+        if self._text_polylines:
+            text = order_paths(self._text_polylines)
+            for color, path in text:
+                self._draw_path(color, path)
+            self._patch_paths.extend(text)
+            self._text_polylines = []
+            position = text[-1][1][-1]
+        if not self._segments:
+            return
+        a, b, colors = zip(*self._segments)
+        if self._optimize_paths:
+            paths = optimize_paths(np.stack([np.array(a), np.array(b)], axis=1), colors, position)
+        else:
+            paths = [(color, np.array([a_i, b_i])) for a_i, b_i, color in self._segments]
+        for color, path in paths:
+            self._draw_path(color, path)
+        self._line_paths.extend(paths)
+        self._segments = []
+
+    @property
+    def paths(self):
+        return self._patch_paths + self._line_paths
 
     def get_draw_point(self):
         return self._curr_draw_point
@@ -61,7 +165,9 @@ class _MatPlotLibRenderer:
 
     def add_circle(self, a, d, color=CUT_THICK):
         self._colors.add(color)
-        self._ax.add_patch(patches.Circle(a, d/2.0, color=self._convert_color(color)))
+        self._draw_circle(a, d, color)
+        theta = np.linspace(0, 2 * np.pi, 33)
+        self._patch_paths.append((color, a + d / 2.0 * np.column_stack((np.cos(theta), np.sin(theta)))))
 
     def add_rectangle(self, a, width, height):
         cs = CoordinateSystem2D(np.array([1, 0]), np.array([0, 1]))
@@ -73,53 +179,91 @@ class _MatPlotLibRenderer:
 
     def add_text(self, a, v, text, max_w, max_h, color=ENGRAVE_THICK, h_center=False, v_center=False):
         self._colors.add(color)
-        text_path = TextPath([0, 0], text, font_properties=FontProperties(fname=Config.font_file))
-        bb = text_path.get_extents()
-        h_adjust, v_adjust = 0, 0
-        if h_center:
-            h_adjust = -(bb.xmin + bb.xmax) / 2
-        if v_center:
-            v_adjust = -(bb.ymin + bb.ymax) / 2
-        text_path = text_path.transformed(
-            transforms.Affine2D().translate(h_adjust, v_adjust)
-        )
-        x_scale = max_w / (bb.xmax - bb.xmin)
-        y_scale = max_h / (bb.ymax - bb.ymin)
-        text_path = text_path.transformed(
-            transforms.Affine2D()
-                # align text with the respective side
-                .rotate(vector_angle_2d(v))
-                # make text as large as will fit in x and y bounds
-                .scale(min(x_scale, y_scale))
-                # move the text to the text point
-                .translate(a[0], a[1])
-        )
+        self.add_text_path(_text_path(self._config.font_file, a, v, text, max_w, max_h, h_center=h_center,
+                                      v_center=v_center), color)
+
+    def add_text_path(self, text_path, color=ENGRAVE_THICK):
+        self._colors.add(color)
+        polylines = [(color, p) for p in text_path.to_polygons(closed_only=False)]
+        if self._optimize_paths:
+            # drawn stroke by stroke once the order is known
+            self._text_polylines.extend(polylines)
+            return
+        self._draw_text_path(text_path, color)
+        self._patch_paths.extend(polylines)
+
+
+class _MatPlotLibRenderer(_Renderer):
+    def __init__(self, panels=True, axis_range=None, optimize_paths=False, config=Config):
+        _Renderer.__init__(self, panels=panels, axis_range=axis_range, optimize_paths=optimize_paths, config=config)
+        self._fig = self._new_figure()
+        self._ax = self._fig.add_subplot(111)
+        self._ax.set_aspect('equal')
+        if axis_range is not None:
+            self._ax.set_xlim(left=0, right=axis_range[0])
+            self._ax.set_ylim(bottom=0, top=axis_range[1])
+
+    @staticmethod
+    def _new_figure():
+        # a figure that isn't registered with pyplot's global figure manager
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        return fig
+
+    @staticmethod
+    def _convert_color(color):
+        return color.r / 255.0, color.g / 255.0, color.b / 255.0
+
+    def _draw_path(self, color, path):
+        self._ax.plot(path[:, 0], path[:, 1], color=self._convert_color(color))
+
+    def _draw_circle(self, a, d, color):
+        self._ax.add_patch(patches.Circle(a, d/2.0, color=self._convert_color(color)))
+
+    def _draw_text_path(self, text_path, color):
         self._ax.add_patch(patches.PathPatch(text_path, facecolor='none', edgecolor=self._convert_color(color)))
 
 
+@register_renderer('dxf')
 class DXFRenderer(_MatPlotLibRenderer):
-    def __init__(self, panels=True, axis_range=None):
-        _MatPlotLibRenderer.__init__(self, panels=panels, axis_range=axis_range)
-        plt.axis('off')
-        plt.margins(0, 0)
-        plt.gca().xaxis.set_major_locator(plt.NullLocator())
-        plt.gca().yaxis.set_major_locator(plt.NullLocator())
-        plt.subplots_adjust(top=1, bottom=0, right=1, left=0, hspace=0, wspace=0)
+    extension = 'svg'
+
+    def __init__(self, panels=True, axis_range=None, optimize_paths=False, config=Config):
+        _MatPlotLibRenderer.__init__(self, panels=panels, axis_range=axis_range, optimize_paths=optimize_paths,
+                                     config=config)
+        self._ax.axis('off')
+        self._ax.margins(0, 0)
+        self._ax.xaxis.set_major_locator(NullLocator())
+        self._ax.yaxis.set_major_locator(NullLocator())
+        self._fig.subplots_adjust(top=1, bottom=0, right=1, left=0, hspace=0, wspace=0)
 
     def update(self):
         pass
 
-    def finish(self, name):
+    def to_bytes(self):
+        self._flush_lines()
         if self._axis_range is not None:
             x_bound = list(map(mm_to_inch, self._ax.get_xbound()))
             y_bound = list(map(mm_to_inch, self._ax.get_ybound()))
-            plt.gcf().set_size_inches(x_bound[1] - x_bound[0], y_bound[1] - y_bound[0])
-        plt.gcf().savefig('{0}.svg'.format(name, format='svg'), bbox_inches=0, pad_inches=0, transparent=True)
-        plt.clf()
+            self._fig.set_size_inches(x_bound[1] - x_bound[0], y_bound[1] - y_bound[0])
+        f = io.BytesIO()
+        self._fig.savefig(f, format='svg', bbox_inches=0, pad_inches=0, transparent=True)
+        return f.getvalue()
+
+    def finish(self, name):
+        with open('{0}.{1}'.format(name, self.extension), 'wb') as f:
+            f.write(self.to_bytes())
 
 
+@register_renderer('debug')
 class DebugRenderer(_MatPlotLibRenderer):
+    # Debug rendering is interactive so it draws on a pyplot figure and must stay on the main thread
+    @staticmethod
+    def _new_figure():
+        return plt.figure()
+
     def update(self):
+        self._flush_lines()
         colors, descriptions = zip(*[(c, c.description) for c in self._colors])
         self._ax.legend(
             [Line2D([0], [0], color=self._convert_color(c), lw=4) for c in colors],
@@ -128,38 +272,70 @@ class DebugRenderer(_MatPlotLibRenderer):
         plt.pause(.1)
 
     def finish(self, name):
+        self._flush_lines()
         plt.show()
-        plt.clf()
+        plt.close(self._fig)
 
 
-class PackingBoxRenderer(_MatPlotLibRenderer):
-    def __init__(self, panels=True):
-        _MatPlotLibRenderer.__init__(self, panels=panels)
-        self._ax = None
-        # garbage comparable minimum and maximum values
-        self._x_min, self._x_max, self._y_min, self._y_max = None, None, None, None
+class PartRenderer(_Renderer):
+    # Records a single part so it can be drawn onto any number of beds without rendering it again
+    def __init__(self, panels=True, area=0.0, config=Config):
+        _Renderer.__init__(self, panels=panels, config=config)
+        # area of the part's outline
+        self.area = area
+        self._circles = []
+        self._text_paths = []
 
-    def add_line(self, a, b, color=CUT_THICK, tab=0.0):
-        if not self._x_min:
-            self._x_min, self._x_max, self._y_min, self._y_max = a[0], a[0], a[1], a[1]
-        for x in (a[0], b[0]):
-            self._x_min = min(self._x_min, x)
-            self._x_max = max(self._x_max, x)
-        for y in (a[1], b[1]):
-            self._y_min = min(self._y_min, y)
-            self._y_max = max(self._y_max, y)
-
-    def add_text(self, a, v, text, max_w, max_h, color=ENGRAVE_THICK, h_center=True, v_center=True):
-        pass
+    def _draw_circle(self, a, d, color):
+        self._circles.append((np.array(a, dtype=float), d, color))
 
-    def add_circle(self, a, r, color=CUT_THICK):
+    def _draw_text_path(self, text_path, color):
+        self._text_paths.append((text_path, color))
+
+    def update(self):
         pass
 
+    def finish(self, name):
+        return self
+
+    @property
+    def lines(self):
+        # (n, 2, 2) array of the start and end of every line along with the color of each
+        return np.array([(a, b) for a, b, _ in self._segments]).reshape(-1, 2, 2), \
+            [color for _, _, color in self._segments]
+
+    @property
+    def box(self):
+        # only lines contribute to the packing box, text and circles are inside them
+        points = np.array([p for a, b, _ in self._segments for p in (a, b)])
+        x_min, y_min = points.min(axis=0)
+        x_max, y_max = points.max(axis=0)
+        padding = self._config.padding
+        return PackingBox(x_min - padding, x_max + padding, y_min - padding, y_max + padding)
+
+    def replay(self, r, translation=np.array([0, 0]), rotation=0.0):
+        # patches first so they keep their order relative to each other
+        for text_path, color in self._text_paths:
+            r.add_text_path(text_path.transformed(
+                transforms.Affine2D().rotate(rotation).translate(translation[0], translation[1])), color)
+        for a, d, color in self._circles:
+            r.add_circle(rotate_cc_around_origin_2d(a, rotation) + translation, d, color=color)
+        for a, b, color in self._segments:
+            r.add_line(rotate_cc_around_origin_2d(a, rotation) + translation,
+                       rotate_cc_around_origin_2d(b, rotation) + translation, color=color)
+
+
+@register_renderer('raster')
+class RasterRenderer(_Renderer):
+    extension = 'png'
+
     def update(self):
         pass
 
+    def to_bytes(self):
+        self._flush_lines()
+        return preview_png(self.paths, self._axis_range, self._config)
+
     def finish(self, name):
-        return PackingBox(self._x_min - Config.padding,
-                          self._x_max + Config.padding,
-                          self._y_min - Config.padding,
-                          self._y_max + Config.padding)
+        with open('{0}.{1}'.format(name, self.extension), 'wb') as f:
+            f.write(self.to_bytes())
@@ -0,0 +1,81 @@
+import json
+
+import numpy as np
+
+from color import *
+from config import Config
+from path_optimizer import travel_length
+
+ENGRAVE_COLORS = (ENGRAVE_THICK, ENGRAVE_THIN)
+CUT_COLORS = (CUT_THICK, CUT_THIN)
+
+
+def bed_report(paths, part_area, bed_area=None, config=Config):
+    """
+    Summarize the work done on one bed.
+
+    paths: (color, polyline) tuples in the order they are emitted
+    part_area: total area of the outlines of the parts placed on the bed
+    Only cut and engrave colors are counted, the positioning frame and packing boxes are never machined.
+    """
+    if bed_area is None:
+        bed_area = config.bed_width * config.bed_height
+    paths = [(color, polyline) for color, polyline in paths if color in CUT_COLORS + ENGRAVE_COLORS]
+    colors = list(dict.fromkeys(color for color, _ in paths))
+    lengths = dict((color, 0.0) for color in colors)
+    pierces = dict((color, 0) for color in colors)
+    if paths:
+        # flatten every polyline into one vertex array, segments between polylines are masked out
+        vertices = np.concatenate([polyline for _, polyline in paths])
+        path_ids = np.repeat(np.arange(len(paths)), [len(polyline) for _, polyline in paths])
+        color_ids = np.array([colors.index(color) for color, _ in paths])
+        segment_lengths = np.where(path_ids[1:] == path_ids[:-1],
+                                   np.linalg.norm(np.diff(vertices, axis=0), axis=1), 0.0)
+        per_color = np.bincount(color_ids[path_ids[1:]], weights=segment_lengths, minlength=len(colors))
+        per_color_pierces = np.bincount(color_ids, minlength=len(colors))
+        lengths = dict((color, float(per_color[i])) for i, color in enumerate(colors))
+        pierces = dict((color, int(per_color_pierces[i])) for i, color in enumerate(colors))
+
+    travel = travel_length(paths)
+    timed = [c for c in colors if c.description in config.cut_speed]
+    time = sum(lengths[c] / config.cut_speed[c.description] + pierces[c] * config.pierce_time for c in timed) + \
+        travel / config.travel_speed
+    return {
+        'cut_length': dict((c.description, lengths[c]) for c in colors if c in CUT_COLORS),
+        'engrave_length': sum(lengths[c] for c in colors if c in ENGRAVE_COLORS),
+        'travel_length': travel,
+        'pierces': sum(pierces.values()),
+        'utilization': part_area / bed_area,
+        'estimated_time': time,
+    }
+
+
+def job_report(beds, unpacked=(), sharding=None):
+    """
+    Combine bed reports into a JSON serializable summary of the whole job.
+
+    unpacked: indices of the parts too large for a bed
+    sharding: the stats of a sharded packing
+    """
+    cut_length = {}
+    for bed in beds:
+        for description, length in bed['cut_length'].items():
+            cut_length[description] = cut_length.get(description, 0.0) + length
+    report = {
+        'beds': beds,
+        'sheets': len(beds),
+        'cut_length': cut_length,
+        'engrave_length': sum(bed['engrave_length'] for bed in beds),
+        'travel_length': sum(bed['travel_length'] for bed in beds),
+        'pierces': sum(bed['pierces'] for bed in beds),
+        'utilization': float(np.mean([bed['utilization'] for bed in beds])) if beds else 0.0,
+        'estimated_time': sum(bed['estimated_time'] for bed in beds),
+        'unpacked': list(unpacked),
+    }
+    if sharding is not None:
+        report['sharding'] = sharding
+    return report
+
+
+def write_report(report, output, name):
+    output.write('{0}.json'.format(name), json.dumps(report, indent=2).encode('utf-8'), {'report': name})
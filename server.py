@@ -0,0 +1,290 @@
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import math
+import multiprocessing
+import numbers
+import os
+from queue import Empty
+import re
+import socketserver
+import threading
+from urllib.parse import urlparse, parse_qsl
+
+from config import Config
+from main import load_faces, build_polygons, render_part, part_records, write_beds
+from output import BundleOutput, QueueOutput
+from renderer import get_renderer, _glyph_path
+
+# request options that aren't Config attributes and their defaults
+OPTIONS = {
+    'name': 'mesh',
+    'merge': True,
+    'panels': True,
+    'optimize_paths': True,
+    'preview': False,
+    'renderer': 'dxf',
+    # also send a file for every part, like main.py --bundle does
+    'parts': False,
+}
+# Config values requests may override, anything else like font_file stays as configured on the host
+OVERRIDES = (
+    'bed_width', 'bed_height', 'padding', 'mat_thickness', 't', 'attachment_tab', 'nail_hole_diameter',
+    'notch_depth', 'min_thickness', 'snap_size', 'text_offset', 'text_height', 'min_edge_width',
+    'cut_speed', 'travel_speed', 'pierce_time', 'preview_scale', 'face_order', 'packer', 'packing_resolution',
+    'packing_size_class_ratio',
+)
+# the values string overrides can take
+CHOICES = {
+    'face_order': ('bfs', 'morton', 'none'),
+    'packer': ('grid', 'rectpack'),
+}
+# names end up in file names and the Content-Disposition header
+NAME_PATTERN = re.compile(r'[A-Za-z0-9_.-]{1,100}')
+PART_CACHE_SIZE = 50000
+# seconds between checks that a worker is still alive while waiting for its output
+POLL_INTERVAL = 1.0
+
+# parts kept by each worker process between requests
+_part_cache = OrderedDict()
+
+
+def _warm():
+    # load the font so the first request doesn't have to
+    for text in '0123456789c':
+        _glyph_path(Config.font_file, text)
+
+
+def _ready(_):
+    return os.getpid()
+
+
+def _cached_part(polygon, render_panels, config, config_key):
+    key = polygon.signature(), render_panels, config_key
+    part = _part_cache.pop(key, None)
+    if part is None:
+        part = render_part(polygon, render_panels, config)
+    _part_cache[key] = part
+    if len(_part_cache) > PART_CACHE_SIZE:
+        _part_cache.popitem(last=False)
+    return part
+
+
+def _convert(queue, stl, overrides, options):
+    output = QueueOutput(queue)
+    try:
+        return _convert_mesh(output, stl, overrides, options)
+    finally:
+        output.close()
+
+
+def _convert_mesh(output, stl, overrides, options):
+    config = Config(**overrides)
+    vectors, faces, face_normals = load_faces(options['name'], options['merge'], fh=io.BytesIO(stl), config=config)
+    polys = build_polygons(faces, face_normals)
+    config_key = json.dumps(overrides, sort_keys=True)
+    parts = [_cached_part(p, options['panels'], config, config_key) for p in polys]
+    return write_beds(get_renderer(options['renderer']), output, options['name'], polys, parts,
+                      part_records(polys), render_panels=options['panels'],
+                      optimize_paths=options['optimize_paths'], preview=options['preview'],
+                      write_parts=options['parts'], config=config)
+
+
+def parse_query(query):
+    """Split a query string into conversion options and Config overrides, values are parsed as JSON if possible."""
+    options, overrides = dict(OPTIONS), {}
+    for key, value in parse_qsl(query):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        if key in options:
+            options[key] = value
+        elif key in OVERRIDES:
+            overrides[key] = _parse_override(key, value)
+        else:
+            raise ValueError('Unknown option {0}.'.format(key))
+    if get_renderer(options['renderer']).extension is None:
+        raise ValueError('Renderer {0} doesn\'t produce files.'.format(options['renderer']))
+    options['name'] = str(options['name'])
+    if not NAME_PATTERN.fullmatch(options['name']):
+        raise ValueError('Name can only contain letters, digits, _, . and -.')
+    return options, overrides
+
+
+def _positive(value):
+    # bool is an int but never a size
+    return isinstance(value, numbers.Real) and not isinstance(value, bool) and math.isfinite(value) and value > 0
+
+
+def _parse_override(key, value):
+    default = getattr(Config, key)
+    if key in CHOICES:
+        if value not in CHOICES[key]:
+            raise ValueError('Expected {0} to be one of {1}.'.format(key, ', '.join(CHOICES[key])))
+        return value
+    if isinstance(default, dict):
+        # only the speeds given are replaced
+        if not isinstance(value, dict) or not all(k in default and _positive(v) for k, v in value.items()):
+            raise ValueError('Expected {0} to be like {1} with positive values.'.format(key, json.dumps(default)))
+        return dict(default, **value)
+    if not _positive(value):
+        raise ValueError('Expected {0} to be a positive number.'.format(key))
+    return value
+
+
+def _next_entry(queue, future):
+    # a worker that is killed never closes its output, so don't wait on the queue once it is gone
+    while True:
+        try:
+            return queue.get(timeout=POLL_INTERVAL)
+        except Empty:
+            if future.done():
+                try:
+                    return queue.get_nowait()
+                except Empty:
+                    return None
+
+
+class _ChunkedWriter(object):
+    # HTTP/1.1 chunked transfer encoding so files can be sent before the length of the response is known
+    def __init__(self, wfile):
+        self._wfile = wfile
+
+    def write(self, data):
+        if len(data):
+            self._wfile.write(b'%x\r\n' % len(data) + bytes(data) + b'\r\n')
+        return len(data)
+
+    def flush(self):
+        self._wfile.flush()
+
+
+class ConvertHandler(BaseHTTPRequestHandler):
+    """
+    POST an .stl to /convert and get back a zip bundle of its beds.
+
+    The query string holds the options in OPTIONS along with Config values in OVERRIDES, for example
+    /convert?name=bunny&preview=true&mat_thickness=6.35. Bundle entries are streamed as each bed is finished.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def address_string(self):
+        # clients of unix sockets don't have addresses
+        return self.client_address[0] if isinstance(self.client_address, tuple) else self.server.server_address
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/convert':
+            self.send_error(404)
+            return
+        try:
+            options, overrides = parse_query(url.query)
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        stl = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        queue = self.server.manager.Queue()
+        pool, future = self.server.submit(_convert, queue, stl, overrides, options)
+        entry = _next_entry(queue, future)
+        if entry is None and future.exception() is not None:
+            self._failed(pool, future)
+            self.send_error(500, str(future.exception()))
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Disposition', 'attachment; filename="{0}.zip"'.format(options['name']))
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        bundle = BundleOutput(_ChunkedWriter(self.wfile))
+        while entry is not None:
+            bundle.write(*entry)
+            entry = _next_entry(queue, future)
+        if future.exception() is not None:
+            self._failed(pool, future)
+            # the response can't be completed, drop the connection so the client sees it was cut short
+            self.log_error('Failed to convert {0}: {1}'.format(options['name'], future.exception()))
+            self.close_connection = True
+            return
+        bundle.close()
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _failed(self, pool, future):
+        if isinstance(future.exception(), BrokenProcessPool):
+            self.server.restart_pool(pool)
+
+
+class _WorkerPool(object):
+    """Mixed into the servers to give them a pool of worker processes that is replaced if a worker dies."""
+    def start_pool(self, workers, manager):
+        self.workers, self.manager = workers, manager
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm)
+        self._pool_lock = threading.Lock()
+        # start every worker now so the first requests don't pay for it
+        list(self.pool.map(_ready, range(workers)))
+
+    def submit(self, *args):
+        # returns the pool the job went to along with its future
+        pool = self.pool
+        try:
+            return pool, pool.submit(*args)
+        except BrokenProcessPool:
+            pool = self.restart_pool(pool)
+            return pool, pool.submit(*args)
+
+    def restart_pool(self, broken):
+        # one dead worker breaks the whole pool, every request after it gets a new one
+        with self._pool_lock:
+            if self.pool is broken:
+                self.pool.shutdown(wait=False)
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm)
+            return self.pool
+
+
+class HTTPServer(_WorkerPool, ThreadingHTTPServer):
+    pass
+
+
+class UnixHTTPServer(_WorkerPool, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(host='127.0.0.1', port=8000, socket_path=None, workers=None):
+    """Serve conversions until interrupted, each worker process converts one mesh at a time."""
+    workers = workers or os.cpu_count()
+    with multiprocessing.Manager() as manager:
+        if socket_path is None:
+            server = HTTPServer((host, port), ConvertHandler)
+            address = 'http://{0}:{1}/convert'.format(host, port)
+        else:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            server = UnixHTTPServer(socket_path, ConvertHandler)
+            address = socket_path
+        server.start_pool(workers, manager)
+        print('Serving on {0} with {1} workers.'.format(address, workers))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            server.pool.shutdown()
+            if socket_path is not None:
+                os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Keep converting meshes sent over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on.')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on.')
+    parser.add_argument('--socket', help='Listen on this unix socket instead of a port.')
+    parser.add_argument('--workers', type=int, help='Number of meshes to convert at once.')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.socket, args.workers)
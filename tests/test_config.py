@@ -0,0 +1,50 @@
+import pytest
+
+from config import Config
+from main import pack_parts
+from packing_box import PackingBox
+
+DEFAULT_THICKNESS = Config.mat_thickness
+
+
+def test_overrides_are_derived_again():
+    config = Config(mat_thickness=6.0)
+    assert config.notch_depth == 6.0
+    assert config.snap_size == pytest.approx(1.5)
+    assert config.text_height == 12.0
+    assert Config(mat_thickness=6.0, notch_depth=2.0).notch_depth == 2.0
+
+
+def test_unknown_values_are_rejected():
+    with pytest.raises(ValueError):
+        Config(thickness=6.0)
+
+
+def test_instances_leave_the_class_alone():
+    Config(mat_thickness=6.0)
+    assert Config.mat_thickness == DEFAULT_THICKNESS
+    assert Config.notch_depth == DEFAULT_THICKNESS
+
+
+def test_defaults_are_read_when_an_instance_is_created(monkeypatch):
+    monkeypatch.setattr(Config, 'mat_thickness', 6.0)
+    config = Config()
+    monkeypatch.undo()
+    assert config.mat_thickness == 6.0
+    assert Config.mat_thickness == DEFAULT_THICKNESS
+
+
+def test_mutable_values_are_copied():
+    speeds = {'CUT_THIN': 5.0}
+    config = Config(cut_speed=speeds)
+    speeds['CUT_THIN'] = 1.0
+    Config().cut_speed['CUT_THICK'] = 1.0
+    assert config.cut_speed == {'CUT_THIN': 5.0}
+    assert Config.cut_speed['CUT_THICK'] != 1.0
+    assert Config().cut_speed is not Config.cut_speed
+
+
+def test_configs_are_passed_down():
+    boxes = [PackingBox(0, 100, 0, 100)]
+    assert len(pack_parts(boxes)[0]) == 1
+    assert pack_parts(boxes, Config(bed_width=50, bed_height=50))[0] == []
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from geometery_utils import adjacency_order, morton_order, reorder_faces
+
+
+def strip(n, offset=0.0):
+    # n triangles in a row, each sharing an edge with the one before it
+    points = [(float(i) + offset, float(i % 2), 0.0) for i in range(n + 2)]
+    return [[points[i], points[i + 1], points[i + 2]] for i in range(n)]
+
+
+def test_morton_order_is_a_permutation():
+    points = np.random.RandomState(0).rand(500, 3)
+    assert sorted(morton_order(points)) == list(range(500))
+
+
+def test_morton_order_keeps_nearby_points_together():
+    points = [[0, 0], [10, 10], [0, 1], [10, 11], [1, 0], [11, 10]]
+    order = list(morton_order(points))
+    assert sorted(order[:3]) == [0, 2, 4]
+    assert sorted(order[3:]) == [1, 3, 5]
+
+
+def test_adjacency_order_walks_across_shared_edges():
+    faces = strip(6)
+    shuffled = [faces[i] for i in (3, 0, 5, 1, 4, 2)]
+    # starting from either end walks along the strip
+    assert [shuffled.index(faces[i]) for i in range(6)] == adjacency_order(shuffled, [1, 0, 2, 3, 4, 5])
+    assert [shuffled.index(faces[i]) for i in reversed(range(6))] == \
+        adjacency_order(shuffled, [2, 0, 1, 3, 4, 5])
+
+
+def test_adjacency_order_starts_each_piece_in_order():
+    faces = strip(3) + strip(2, offset=100.0)
+    assert adjacency_order(faces, [3, 0, 1, 2, 4]) == [3, 4, 0, 1, 2]
+
+
+@pytest.mark.parametrize('method', ['bfs', 'morton'])
+def test_reorder_faces_is_a_permutation(method):
+    faces = strip(5) + strip(4, offset=100.0)
+    normals = [[0.0, 0.0, float(i)] for i in range(len(faces))]
+    reordered, reordered_normals = reorder_faces(faces, normals, method)
+    order = [faces.index(face) for face in reordered]
+    assert sorted(order) == list(range(len(faces)))
+    assert reordered_normals == [normals[i] for i in order]
+
+
+def test_reorder_faces_none_keeps_the_order():
+    faces, normals = strip(4), [[0.0, 0.0, 1.0]] * 4
+    assert reorder_faces(faces, normals, 'none') == (faces, normals)
+
+
+def test_reorder_faces_rejects_unknown_methods():
+    with pytest.raises(ValueError):
+        reorder_faces(strip(2), [[0.0, 0.0, 1.0]] * 2, 'random')
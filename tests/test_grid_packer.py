@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from rectpack import PackingBin, PackingMode, newPacker
+from rectpack import maxrects, skyline
+
+from grid_packer import MaxRectsBaf, SkylineBl, pack, pack_sharded, packing_order
+
+BIN_WIDTH, BIN_HEIGHT = 30500, 20000
+
+
+def random_sizes(n, seed=0):
+    rng = np.random.RandomState(seed)
+    return np.column_stack((rng.randint(500, 9000, n), rng.randint(500, 7000, n)))
+
+
+def check_bins(bins, sizes, bin_width=BIN_WIDTH, bin_height=BIN_HEIGHT):
+    rids = [rect.rid for b in bins for rect in b]
+    assert sorted(rids) == list(range(len(sizes)))
+    for b in bins:
+        rects = np.array([(r.x, r.y, r.width, r.height) for r in b])
+        x, y, w, h = rects.T
+        assert (x >= 0).all() and (y >= 0).all()
+        assert (x + w <= bin_width).all() and (y + h <= bin_height).all()
+        for r, (rw, rh) in zip(b, rects[:, 2:]):
+            assert sorted((rw, rh)) == sorted(sizes[r.rid])
+        overlap = (x[:, None] < x + w) & (x < (x + w)[:, None]) & (y[:, None] < y + h) & (y < (y + h)[:, None])
+        np.fill_diagonal(overlap, False)
+        assert not overlap.any()
+
+
+def rectpack_bin_count(sizes, pack_algo):
+    packer = newPacker(mode=PackingMode.Offline, pack_algo=pack_algo, bin_algo=PackingBin.BFF, rotation=True)
+    for rid, (w, h) in enumerate(sizes):
+        packer.add_rect(int(w), int(h), rid=rid)
+    packer.add_bin(BIN_WIDTH, BIN_HEIGHT, count=float('inf'))
+    packer.pack()
+    return len(packer)
+
+
+@pytest.mark.parametrize('pack_algo, rectpack_algo', [
+    (MaxRectsBaf, maxrects.MaxRectsBaf),
+    (SkylineBl, skyline.SkylineBl),
+])
+def test_pack_matches_rectpack(pack_algo, rectpack_algo):
+    sizes = random_sizes(300)
+    bins = pack(sizes, BIN_WIDTH, BIN_HEIGHT, pack_algo=pack_algo)
+    check_bins(bins, sizes)
+    expected = rectpack_bin_count(sizes, rectpack_algo)
+    assert len(bins) <= expected + max(1, int(.05 * expected))
+
+
+def test_pack_skips_rectangles_larger_than_the_bin():
+    sizes = np.array([[1000, 1000], [BIN_WIDTH + 1, 10], [10, BIN_WIDTH + 1]])
+    bins = pack(sizes, BIN_WIDTH, BIN_HEIGHT)
+    assert [rect.rid for b in bins for rect in b] == [0]
+
+
+def test_pack_rotates_to_fit():
+    bins = pack([[BIN_HEIGHT, BIN_WIDTH]], BIN_WIDTH, BIN_HEIGHT)
+    assert (bins[0][0].width, bins[0][0].height) == (BIN_WIDTH, BIN_HEIGHT)
+    assert pack([[BIN_HEIGHT, BIN_WIDTH]], BIN_WIDTH, BIN_HEIGHT, rotation=False) == []
+
+
+def test_pack_sharded_places_everything_once():
+    sizes = random_sizes(600, seed=1)
+    bins, stats = pack_sharded(sizes, BIN_WIDTH, BIN_HEIGHT, shard_size=200, workers=2, compare=True)
+    check_bins(bins, sizes)
+    assert stats['shards'] == 3
+    assert stats['bins'] == len(bins)
+    assert stats['baseline'] == 'unsharded'
+    assert stats['bins'] <= stats['baseline_bins'] + 3
+
+
+def test_occupy_keeps_free_space_clear():
+    b = MaxRectsBaf(100, 100)
+    b.occupy(0, 0, 60, 100)
+    x, y, w, h = b.place(40, 100)
+    assert (x, y) == (60, 0)
+    assert b.place(1, 1) is None
+
+
+def test_packing_order_keeps_input_order_within_size_classes():
+    sizes = np.array([[10, 10], [40, 40], [11, 10], [41, 40], [10, 11]])
+    assert list(packing_order(sizes)) == [3, 1, 2, 4, 0]
+    assert list(packing_order(sizes, size_class_ratio=2)) == [1, 3, 0, 2, 4]
+
+
+def test_pack_sharded_keeps_size_classes_together():
+    sizes = np.tile([5000, 5000], (600, 1))
+    bins, stats = pack_sharded(sizes, BIN_WIDTH, BIN_HEIGHT, shard_size=200, workers=2, size_class_ratio=1.25)
+    check_bins(bins, sizes)
+    assert stats['shards'] == 3
+    # 24 squares fit on a bin so no packing can beat the area bound
+    assert stats['baseline'] == 'area_bound'
+    assert stats['baseline_bins'] == 25
+    runs = [sorted(r.rid for r in b) for b in bins]
+    runs = [rids for rids in runs if rids == list(range(rids[0], rids[0] + len(rids)))]
+    # only the bin the leftovers of every shard were consolidated into mixes them
+    assert len(runs) == len(bins) - 1
+    assert all(rids[0] // 200 == rids[-1] // 200 for rids in runs)
@@ -0,0 +1,54 @@
+import io
+import json
+import zipfile
+
+from output import BundleOutput
+
+
+class Unseekable(object):
+    # like the chunked writer the server streams bundles through, it can only be written to
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return b''.join(self.chunks)
+
+
+def test_bundle_streams_to_unseekable_writers():
+    writer = Unseekable()
+    bundle = BundleOutput(writer)
+    bundle.write('mesh-bed0_0_5.svg', b'<svg/>', {'bed': 'mesh-bed0_0_5', 'parts': [{'part': 0}]})
+    # entries and their records are written as soon as they are finished
+    written = writer.getvalue()
+    assert b'mesh-bed0_0_5.svg' in written and b'manifest/mesh-bed0_0_5.svg.json' in written
+    bundle.write('mesh-bed0_0_5.png', b'\x89PNG', {'bed': 'mesh-bed0_0_5'})
+    bundle.write('mesh-report.json', b'{}')
+    bundle.close()
+
+    with zipfile.ZipFile(io.BytesIO(writer.getvalue())) as z:
+        assert z.namelist() == ['mesh-bed0_0_5.svg', 'manifest/mesh-bed0_0_5.svg.json', 'mesh-bed0_0_5.png',
+                                'manifest/mesh-bed0_0_5.png.json', 'mesh-report.json', 'manifest.json']
+        assert z.read('mesh-bed0_0_5.svg') == b'<svg/>'
+        assert z.getinfo('mesh-bed0_0_5.png').compress_type == zipfile.ZIP_STORED
+        assert json.loads(z.read('manifest/mesh-bed0_0_5.svg.json')) == {'bed': 'mesh-bed0_0_5', 'parts': [{'part': 0}]}
+        assert json.loads(z.read('manifest.json')) == {'entries': {
+            'mesh-bed0_0_5.svg': {'bed': 'mesh-bed0_0_5', 'parts': [{'part': 0}]},
+            'mesh-bed0_0_5.png': {'bed': 'mesh-bed0_0_5'},
+            'mesh-report.json': None,
+        }}
+
+
+def test_bundle_writes_to_paths(tmp_path):
+    path = str(tmp_path / 'mesh.zip')
+    bundle = BundleOutput(path)
+    bundle.write('mesh-part0-0_1_2.svg', b'<svg/>', {'part': 0, 'bed': None})
+    bundle.close()
+    with zipfile.ZipFile(path) as z:
+        assert json.loads(z.read('manifest/mesh-part0-0_1_2.svg.json')) == {'part': 0, 'bed': None}
@@ -0,0 +1,64 @@
+import numpy as np
+
+from color import *
+from path_optimizer import COLOR_ORDER, chain_segments, optimize_paths, order_paths, order_polylines, travel_length
+
+
+def random_segments(n, seed=0):
+    rng = np.random.RandomState(seed)
+    a = rng.uniform(0, 300, (n, 2))
+    return np.stack([a, a + rng.uniform(-5, 5, (n, 2))], axis=1)
+
+
+def segment_set(paths):
+    # every drawn segment with its ends sorted, so direction doesn't matter
+    return sorted(tuple(sorted((tuple(np.round(a, 6)), tuple(np.round(b, 6)))))
+                  for _, polyline in paths for a, b in zip(polyline[:-1], polyline[1:]))
+
+
+def test_chain_segments_joins_shuffled_square():
+    corners = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=float)
+    segments = np.array([[corners[i], corners[(i + 1) % 4]] for i in (2, 0, 3, 1)])
+    polylines = chain_segments(segments)
+    assert len(polylines) == 1
+    assert len(polylines[0]) == 5
+    assert np.allclose(polylines[0][0], polylines[0][-1])
+
+
+def test_optimize_paths_keeps_every_segment():
+    segments = random_segments(500)
+    colors = [CUT_THICK] * 250 + [ENGRAVE_THIN] * 250
+    paths = optimize_paths(segments, colors)
+    assert segment_set(paths) == segment_set([(c, s) for c, s in zip(colors, segments)])
+
+
+def test_optimize_paths_follows_color_order():
+    segments = random_segments(300)
+    colors = [(CUT_THICK, CUT_THIN, ENGRAVE_THICK)[i % 3] for i in range(len(segments))]
+    ranks = [COLOR_ORDER.index(color) for color, _ in optimize_paths(segments, colors)]
+    assert ranks == sorted(ranks)
+
+
+def test_optimize_paths_reduces_travel():
+    segments = random_segments(1000, seed=1)
+    colors = [CUT_THICK] * len(segments)
+    unordered = [(CUT_THICK, s) for s in segments]
+    assert travel_length(optimize_paths(segments, colors)) < .5 * travel_length(unordered)
+
+
+def test_order_polylines_only_reorders_and_reverses():
+    polylines = [s for s in random_segments(200, seed=2)]
+    ordered = order_polylines(polylines)
+    assert len(ordered) == len(polylines)
+    assert segment_set([(None, p) for p in ordered]) == segment_set([(None, p) for p in polylines])
+
+
+def test_order_paths_keeps_polylines_whole():
+    rng = np.random.RandomState(3)
+    paths = [((ENGRAVE_THICK, ENGRAVE_THIN)[i % 2], rng.uniform(0, 100, (4, 2))) for i in range(100)]
+    ordered = order_paths(paths)
+    originals = [p.tobytes() for _, p in paths]
+    for color, polyline in ordered:
+        assert polyline.tobytes() in originals or polyline[::-1].tobytes() in originals
+    assert [c for c, _ in ordered] == [ENGRAVE_THIN] * 50 + [ENGRAVE_THICK] * 50
+    assert travel_length(ordered) < travel_length(paths)
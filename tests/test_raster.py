@@ -0,0 +1,46 @@
+import io
+
+import numpy as np
+from matplotlib import image
+
+from color import *
+from config import Config
+from raster import encode_png, preview_png, rasterize
+
+COLORS = (CUT_THICK, CUT_THIN, ENGRAVE_THICK, ENGRAVE_THIN, FRAME, DEBUG)
+
+
+def decode(png):
+    return np.round(image.imread(io.BytesIO(png), format='png')[:, :, :3] * 255).astype(np.uint8)
+
+
+def test_encode_png_round_trips():
+    pixels = np.random.RandomState(0).randint(0, 256, (7, 11, 3)).astype(np.uint8)
+    assert (decode(encode_png(pixels)) == pixels).all()
+
+
+def test_each_color_lands_on_its_own_row():
+    # one horizontal line per color from x = 1 to 4 mm, a mm apart starting at the bottom
+    paths = [(color, np.array([[1.0, y], [4.0, y]])) for y, color in enumerate(COLORS)]
+    pixels = decode(preview_png(paths, axis_range=(10, 6), config=Config(preview_scale=2)))
+    assert pixels.shape == (12, 20, 3)
+
+    expected = np.full((12, 20, 3), 255, dtype=np.uint8)
+    for y, color in enumerate(COLORS):
+        # rows run top to bottom so y = 0 is the last one
+        expected[11 - 2 * y, 2:9] = color.r, color.g, color.b
+    assert (pixels == expected).all()
+
+
+def test_rasterize_defaults_to_the_bounds_of_the_paths():
+    paths = [(CUT_THICK, np.array([[10.0, 20.0], [14.0, 20.0], [14.0, 22.0]]))]
+    pixels = rasterize(paths, scale=1, config=Config(padding=1.0))
+    # 4 x 2 mm of lines and a mm of padding all round
+    assert pixels.shape == (4, 6, 3)
+    assert (pixels[2, 1:6] == (0, 0, 255)).all()
+    assert (pixels[0:3, 5] == (0, 0, 255)).all()
+    assert (pixels[3] == 255).all() and (pixels[:, 0] == 255).all()
+
+
+def test_rasterize_empty_paths_is_blank():
+    assert (rasterize([], axis_range=(3, 2), scale=1) == 255).all()
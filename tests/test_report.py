@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from color import *
+from config import Config
+from geometery_utils import polygon_area_2d
+from report import bed_report, job_report
+
+
+def square(x, y, size):
+    return np.array([[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]], dtype=float)
+
+
+def test_bed_report_lengths_and_pierces():
+    paths = [(ENGRAVE_THIN, np.array([[0, 0], [3, 4]], dtype=float)),
+             (CUT_THICK, square(10, 0, 2)),
+             (CUT_THICK, square(20, 0, 1))]
+    report = bed_report(paths, 50.0, bed_area=100.0)
+    assert report['engrave_length'] == pytest.approx(5)
+    assert report['cut_length'] == {'CUT_THICK': pytest.approx(12)}
+    assert report['pierces'] == 3
+    # from the origin to the line, then to each square
+    assert report['travel_length'] == pytest.approx(0 + np.hypot(7, 4) + 10)
+    assert report['utilization'] == pytest.approx(.5)
+
+
+def test_bed_report_estimated_time():
+    paths = [(CUT_THICK, np.array([[0, 0], [16, 0]], dtype=float))]
+    report = bed_report(paths, 0.0, bed_area=1.0)
+    assert report['estimated_time'] == pytest.approx(
+        16 / Config.cut_speed['CUT_THICK'] + Config.pierce_time)
+
+
+def test_bed_report_defaults_to_config_bed():
+    report = bed_report([], Config.bed_width * Config.bed_height / 4)
+    assert report['utilization'] == pytest.approx(.25)
+    assert report['travel_length'] == 0.0
+
+
+def test_job_report_sums_beds():
+    beds = [bed_report([(CUT_THICK, square(0, 0, 1))], 1.0, bed_area=4.0),
+            bed_report([(CUT_THICK, square(0, 0, 2)), (CUT_THIN, square(5, 5, 1))], 3.0, bed_area=4.0)]
+    report = job_report(beds)
+    assert report['sheets'] == 2
+    assert report['cut_length'] == {'CUT_THICK': pytest.approx(12), 'CUT_THIN': pytest.approx(4)}
+    assert report['pierces'] == 3
+    assert report['utilization'] == pytest.approx(.5)
+    assert report['estimated_time'] == pytest.approx(sum(bed['estimated_time'] for bed in beds))
+
+
+def test_polygon_area_2d_ignores_winding():
+    triangle = [[0, 0], [4, 0], [0, 3]]
+    assert polygon_area_2d(triangle) == pytest.approx(6)
+    assert polygon_area_2d(triangle[::-1]) == pytest.approx(6)
+
+
+def test_bed_report_leaves_out_frame_and_debug_lines():
+    cut = [(CUT_THICK, square(10, 0, 2))]
+    report = bed_report([(FRAME, square(0, 0, 100)), (DEBUG, square(10, 0, 3))] + cut, 0.0, bed_area=1.0)
+    assert report == bed_report(cut, 0.0, bed_area=1.0)
+    assert report['cut_length'] == {'CUT_THICK': pytest.approx(8)}
+    assert report['pierces'] == 1
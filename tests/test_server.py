@@ -0,0 +1,50 @@
+import pytest
+
+from config import Config
+from server import OPTIONS, parse_query
+
+
+def test_options_and_overrides_are_split():
+    options, overrides = parse_query('name=bunny&preview=true&mat_thickness=6.35&face_order=morton')
+    assert options == dict(OPTIONS, name='bunny', preview=True)
+    assert overrides == {'mat_thickness': 6.35, 'face_order': 'morton'}
+
+
+def test_numbers_can_be_ints_or_floats():
+    _, overrides = parse_query('bed_width=400.5&preview_scale=1.5&padding=1')
+    assert overrides == {'bed_width': 400.5, 'preview_scale': 1.5, 'padding': 1}
+
+
+@pytest.mark.parametrize('query', [
+    'bed_width=true',
+    'bed_width=wide',
+    'packing_resolution=0',
+    'mat_thickness=-3',
+    't=NaN',
+    'bed_height=Infinity',
+    'face_order=random',
+    'packer=[]',
+    'cut_speed=5',
+    'cut_speed={"CUT_THIN":0}',
+    'cut_speed={"FAST":10}',
+])
+def test_bad_overrides_are_rejected(query):
+    with pytest.raises(ValueError):
+        parse_query(query)
+
+
+def test_speeds_not_given_keep_their_defaults():
+    _, overrides = parse_query('cut_speed={"CUT_THIN":5}')
+    assert overrides['cut_speed'] == dict(Config.cut_speed, CUT_THIN=5)
+
+
+@pytest.mark.parametrize('query', ['font_file=/etc/passwd', 'thickness=3', 'renderer=debug'])
+def test_unknown_and_unsafe_options_are_rejected(query):
+    with pytest.raises(ValueError):
+        parse_query(query)
+
+
+@pytest.mark.parametrize('name', ['a/b', 'a%0D%0AX-Injected:%201', 'a%22b', 'x' * 101])
+def test_names_are_limited_to_safe_characters(name):
+    with pytest.raises(ValueError):
+        parse_query('name=' + name)
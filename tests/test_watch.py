@@ -0,0 +1,104 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import watch
+from config import Config
+from geometery_utils import adjacent_nlets
+from grid_packer import PackedRect
+from packing_box import PackingBox
+from renderer import PartRenderer
+from watch import Watcher
+
+MESH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'meshes', 'u.stl')
+
+
+def outline_part(polygon, render_panels):
+    # rendering the edge indices needs the font, the outline is all the watcher's bookkeeping looks at
+    r = PartRenderer(panels=render_panels)
+    for a, b in adjacent_nlets([polygon.flatten_point(p)[:2] for p in polygon.points], 2):
+        r.add_line(a, b)
+    return r
+
+
+def box(width, height):
+    return PackingBox(0, width, 0, height)
+
+
+def check_beds(bins, boxes):
+    assert sorted(rect.rid for bed in bins for rect in bed) == list(range(len(boxes)))
+    for bed in bins:
+        rects = np.array([(r.x, r.y, r.width, r.height) for r in bed], dtype=float)
+        x, y, w, h = rects.T
+        assert (x >= 0).all() and (y >= 0).all()
+        assert (x + w <= Config.bed_width + 1e-6).all() and (y + h <= Config.bed_height + 1e-6).all()
+        overlap = (x[:, None] < x + w - 1e-6) & (x < (x + w)[:, None] - 1e-6) & \
+            (y[:, None] < y + h - 1e-6) & (y < (y + h)[:, None] - 1e-6)
+        np.fill_diagonal(overlap, False)
+        assert not overlap.any()
+
+
+@pytest.fixture
+def watcher():
+    w = Watcher(MESH, 'u', renderer_name='dxf')
+    # two parts side by side on the first bed and one filling nearly all of the second
+    w._boxes = [box(100, 100), box(100, 100), box(300, 190)]
+    w._bins = [[PackedRect(0, 0, 100, 100, 0), PackedRect(100, 0, 100, 100, 1)], [PackedRect(0, 0, 300, 190, 2)]]
+    yield w
+    w._pool.shutdown()
+
+
+def test_refit_keeps_parts_that_still_fit_their_slot(watcher):
+    boxes = [box(80, 90), box(100, 100), box(300, 190)]
+    bins = watcher._refit(boxes)
+    check_beds(bins, boxes)
+    assert [(r.rid, r.x, r.y, r.width, r.height) for r in bins[0]] == [(0, 0, 0, 80, 90), (1, 100, 0, 100, 100)]
+    assert bins[1] == watcher._bins[1]
+
+
+def test_refit_moves_parts_into_free_space(watcher):
+    boxes = [box(100, 100), box(150, 100), box(300, 190)]
+    bins = watcher._refit(boxes)
+    check_beds(bins, boxes)
+    assert bins[0][0] == watcher._bins[0][0]
+    assert [r.rid for r in bins[0]] == [0, 1]
+    assert bins[1] == watcher._bins[1]
+
+
+def test_refit_only_repacks_the_bed_a_part_no_longer_fits_on(watcher):
+    boxes = [box(100, 100), box(250, 150), box(300, 190)]
+    bins = watcher._refit(boxes)
+    check_beds(bins, boxes)
+    assert len(bins) == 3
+    assert watcher._bins[1] in bins
+
+
+def test_update_removes_beds_that_are_gone(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(watch, 'render_part', outline_part)
+    os.mkdir('u')
+    # left behind by an earlier session
+    open(os.path.join('u', 'u-bed9_0_99.dxf'), 'w').close()
+
+    def written():
+        with open(os.path.join('u', 'u-report.json')) as f:
+            report = json.load(f)
+        beds = sorted(os.path.splitext(f)[0] for f in os.listdir('u') if f.startswith('u-bed'))
+        assert beds == sorted(bed['name'] for bed in report['beds'])
+        return beds
+
+    w = Watcher(MESH, 'u', renderer_name='dxf')
+    try:
+        monkeypatch.setattr(Config, 'bed_width', 100)
+        w.update()
+        before = written()
+        # what poll does when config.py changes
+        monkeypatch.setattr(Config, 'bed_width', 500)
+        w.forget()
+        w.update()
+        after = written()
+    finally:
+        w._pool.shutdown()
+    assert len(after) < len(before)
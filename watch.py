@@ -0,0 +1,212 @@
+import importlib.util
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config import Config
+from grid_packer import MaxRectsBaf, PackedRect
+from main import load_faces, build_polygons, render_part, pack_parts, unpacked_parts, print_packing, bed_name, \
+    placement, write_bed
+from output import DirectoryOutput
+from renderer import get_renderer
+from report import job_report, write_report
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.py')
+
+
+def reload_config():
+    # every module holds on to the Config class itself so it has to be updated in place
+    spec = importlib.util.spec_from_file_location('_watched_config', CONFIG_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    for key, value in vars(module.Config).items():
+        if not key.startswith('__') and not callable(value):
+            setattr(Config, key, value)
+
+
+def _free_space(bed, resolution):
+    # a bin holding everything already on the bed, in the grid packer's integer coordinates
+    free = MaxRectsBaf(int(Config.bed_width / resolution + 1e-6), int(Config.bed_height / resolution + 1e-6))
+    for rect in bed:
+        x, y = int(round(float(rect.x) / resolution)), int(round(float(rect.y) / resolution))
+        free.occupy(x, y, int(np.ceil(float(rect.width) / resolution - 1e-6)),
+                    int(np.ceil(float(rect.height) / resolution - 1e-6)))
+    return free
+
+
+class Watcher(object):
+    """
+    Keeps a mesh's parts and beds in memory and writes them again whenever the mesh or config.py changes.
+
+    Parts are cached by their polygon's signature so only parts touching edited faces are rendered again, and
+    beds are only rendered again when the parts placed on them or their placements change.
+    """
+    def __init__(self, mesh_file, output_name, merge=True, render_panels=True, optimize_paths=True, preview=False,
+                 renderer_name='dxf', workers=None):
+        self._mesh_file = mesh_file
+        self._output_name = output_name
+        self._merge = merge
+        self._render_panels = render_panels
+        self._optimize_paths = optimize_paths
+        self._preview = preview
+        self._renderer = get_renderer(renderer_name)
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._staging = os.path.join(output_name, '.staging')
+
+        self._seen_mtimes = None
+        self._built_mtimes = None
+        self._parts = {}
+        # packing boxes of the parts placed on self._bins, indexed by polygon
+        self._boxes = None
+        self._bins = None
+        # bed name -> (what is drawn on the bed, the bed's report)
+        self._beds = {}
+
+    def _mtimes(self):
+        return tuple(os.stat(f).st_mtime_ns if os.path.exists(f) else None for f in (self._mesh_file, CONFIG_FILE))
+
+    def poll(self):
+        # only rebuild once the files have stopped changing so half written exports are skipped
+        mtimes = self._mtimes()
+        stable = mtimes == self._seen_mtimes
+        self._seen_mtimes = mtimes
+        if not stable or mtimes == self._built_mtimes or mtimes[0] is None:
+            return False
+        if self._built_mtimes is not None and mtimes[1] != self._built_mtimes[1]:
+            reload_config()
+            self.forget()
+        self._built_mtimes = mtimes
+        return True
+
+    def forget(self):
+        # everything cached was built with the old config
+        self._parts = {}
+        self._boxes = None
+        self._beds = {}
+
+    def update(self):
+        vectors, faces, face_normals = load_faces(self._mesh_file, self._merge)
+        polys = build_polygons(faces, face_normals)
+        signatures = [p.signature() for p in polys]
+
+        missing = dict((s, p) for s, p in zip(signatures, polys) if s not in self._parts)
+        rendered = self._pool.map(lambda p: render_part(p, self._render_panels), missing.values())
+        self._parts.update(zip(missing.keys(), rendered))
+        # drop parts that are no longer in the mesh
+        self._parts = dict((s, self._parts[s]) for s in signatures)
+        parts = [self._parts[s] for s in signatures]
+
+        boxes = [part.box for part in parts]
+        if self._boxes is None or len(boxes) != len(self._boxes):
+            self._bins, _ = pack_parts(boxes)
+        else:
+            self._bins = self._refit(boxes)
+        self._boxes = boxes
+        unpacked = unpacked_parts(self._bins, boxes)
+        print_packing(boxes, unpacked)
+
+        beds = []
+        for i, bed in enumerate(self._bins):
+            contents = tuple((signatures[rect.rid], rect.x, rect.y, rect.width, rect.height) for rect in bed)
+            beds.append((bed_name(self._output_name, i, bed, polys), bed, contents))
+        stale = [(name, bed, contents) for name, bed, contents in beds
+                 if name not in self._beds or self._beds[name][0] != contents]
+
+        os.makedirs(self._staging, exist_ok=True)
+        staging = DirectoryOutput(self._staging)
+
+        def render(name, bed, contents):
+            report = write_bed(self._renderer, staging, name, bed, parts,
+                               render_panels=self._render_panels, optimize_paths=self._optimize_paths,
+                               preview=self._preview)
+            return name, contents, dict(report, name=name)
+
+        for name, contents, report in self._pool.map(lambda b: render(*b), stale):
+            self._beds[name] = (contents, report)
+        names = set(name for name, _, _ in beds)
+        self._beds = dict((name, self._beds[name]) for name in names)
+        write_report(job_report([self._beds[name][1] for name, _, _ in beds], unpacked), staging,
+                     '{0}-report'.format(self._output_name))
+
+        # os.replace is atomic so readers only ever see complete files
+        for f in os.listdir(self._staging):
+            os.replace(os.path.join(self._staging, f), os.path.join(self._output_name, f))
+        os.rmdir(self._staging)
+        # the directory rather than the cache says what was written, it is emptied when config.py changes and
+        # starts out empty even if an earlier session left beds behind
+        prefix = '{0}-bed'.format(self._output_name)
+        for f in os.listdir(self._output_name):
+            stem = os.path.splitext(f)[0]
+            if stem.startswith(prefix) and stem not in names:
+                os.remove(os.path.join(self._output_name, f))
+        return len(missing), len(stale)
+
+    def _refit(self, boxes):
+        """
+        Update the packing for parts whose boxes changed while moving as little as possible.
+
+        A changed part stays where it was if its new box still fits in its old slot, otherwise it is placed in the
+        free space of the first bed it fits on, starting with its own. Only when it fits nowhere are the parts of its
+        bed packed again.
+        """
+        changed = [rid for rid, (box, old) in enumerate(zip(boxes, self._boxes)) if box.rect != old.rect]
+        slots = dict((rect.rid, (i, j)) for i, bed in enumerate(self._bins) for j, rect in enumerate(bed))
+        if any(rid not in slots for rid in changed):
+            # a part that didn't fit on a bed before might now
+            return pack_parts(boxes)[0]
+
+        bins = [list(bed) for bed in self._bins]
+        displaced = []
+        for rid in changed:
+            i, j = slots[rid]
+            old = bins[i][j]
+            _, rot = placement(old, self._boxes[rid])
+            w, h = (boxes[rid].height, boxes[rid].width) if rot else (boxes[rid].width, boxes[rid].height)
+            if w <= float(old.width) and h <= float(old.height):
+                bins[i][j] = PackedRect(old.x, old.y, w, h, rid)
+            else:
+                displaced.append((i, rid))
+        for i, rid in displaced:
+            bins[i] = [rect for rect in bins[i] if rect.rid != rid]
+
+        resolution = Config.packing_resolution
+        affected = set()
+        for i, rid in sorted(displaced, key=lambda d: -boxes[d[1]].width * boxes[d[1]].height):
+            w, h = boxes[rid].int_rect(resolution)
+            for k in [i] + [k for k in range(len(bins)) if k != i]:
+                placed = _free_space(bins[k], resolution).place(w, h)
+                if placed is not None:
+                    bins[k].append(PackedRect(*[v * resolution for v in placed], rid=rid))
+                    break
+            else:
+                bins[i].append(PackedRect(0, 0, boxes[rid].width, boxes[rid].height, rid))
+                affected.add(i)
+        if not affected:
+            return [bed for bed in bins if bed]
+
+        affected = sorted(affected)
+        rids = [rect.rid for i in affected for rect in bins[i]]
+        repacked = [[PackedRect(r.x, r.y, r.width, r.height, rids[r.rid]) for r in bed]
+                    for bed in pack_parts([boxes[rid] for rid in rids])[0]]
+        for k, i in enumerate(affected):
+            bins[i] = repacked[k] if k < len(repacked) else []
+        return [bed for bed in bins if bed] + repacked[len(affected):]
+
+    def run(self, interval=.5):
+        os.makedirs(self._output_name, exist_ok=True)
+        print('Watching {0} and {1} for changes.'.format(self._mesh_file, CONFIG_FILE))
+        try:
+            while True:
+                if self.poll():
+                    start = time.time()
+                    try:
+                        parts, beds = self.update()
+                        print('Rendered {0} parts and {1} beds in {2:.2f}s.'.format(parts, beds, time.time() - start))
+                    except Exception as e:
+                        # keep watching, the next export will probably fix it
+                        print('Failed to update {0}: {1}'.format(self._output_name, e))
+                time.sleep(interval)
+        finally:
+            self._pool.shutdown()